@@ -744,7 +744,6 @@ async function executeAutomationForAccount(authToken, content, accountName) {
                 } catch (err) {
                     console.error(`[Campaign Action Error] Post failed: ${err.message}`);
                 }
-                await new Promise(r => setTimeout(r, 5000));
             }
         }
 
@@ -806,7 +805,6 @@ async function executeAutomationForAccount(authToken, content, accountName) {
             } catch (err) {
                 console.error(`[Campaign Action Error] ${action.type} failed: ${err.message}`);
             }
-            await new Promise(r => setTimeout(r, 5000));
         }
 
         console.log(`[Campaign] ✅ ${accountName} finished successfully!`);
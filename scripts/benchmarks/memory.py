@@ -0,0 +1,191 @@
+"""
+Memory of N logged-in accounts: one Chrome per account against several
+accounts per Chrome in separate browser contexts.
+
+Starts the local x.com stand-in (see standin.py), opens N accounts with
+distinct tokens the way the action scripts do, once with utils.setup_browser
+(a Chrome each) and once with session_pool.BrowserHosts (browser contexts),
+and sums the memory of every process Chrome started. PSS is used where the
+kernel reports it, so pages shared between Chrome processes are counted
+once, RSS elsewhere. Each model also checks that every page only sees its
+own auth_token cookie.
+
+Needs Linux (/proc) and Chrome/Chromium.
+
+Usage (from scripts/):
+    python benchmarks/memory.py
+    python benchmarks/memory.py --accounts 16 --accounts-per-browser 8 --run-mode headless
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(BENCH_DIR)
+ACTIONS_DIR = os.path.join(SCRIPTS_DIR, 'twitter_actions')
+
+sys.path.insert(0, BENCH_DIR)
+from standin import XStandIn, serve
+
+MODELS = ('process', 'contexts')
+
+
+def child_pids(root):
+    """Every process descended from `root`, from the parent ids in /proc/<pid>/stat."""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces; fields after it are fixed
+                parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+
+    found, frontier = [], [root]
+    while frontier:
+        pid = frontier.pop()
+        children = [child for child, parent in parents.items() if parent == pid]
+        found.extend(children)
+        frontier.extend(children)
+    return found
+
+
+def process_memory_kb(pid):
+    """PSS of `pid` in kB, or its RSS where smaps_rollup is not available. 0 once it is gone."""
+    for path, field in ((f'/proc/{pid}/smaps_rollup', 'Pss:'), (f'/proc/{pid}/status', 'VmRSS:')):
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.startswith(field):
+                        return int(line.split()[1])
+        except OSError:
+            continue
+    return 0
+
+
+def browser_memory():
+    """(process count, total MB) of everything this process has started."""
+    pids = child_pids(os.getpid())
+    return len(pids), sum(process_memory_kb(pid) for pid in pids) / 1024
+
+
+async def isolated(page, auth_token):
+    """True if `page` sees its own auth_token and no other."""
+    from utils import x_url
+    import nodriver as uc
+    cookies = await page.send(uc.cdp.network.get_cookies(urls=[x_url()]))
+    return [c.value for c in cookies if c.name == 'auth_token'] == [auth_token]
+
+
+async def measure(model, tokens, accounts_per_browser, run_mode, settle):
+    from utils import setup_browser
+    from session_pool import BrowserHosts
+
+    hosts = BrowserHosts(accounts_per_browser, run_mode) if model == 'contexts' else None
+
+    async def open_account(token):
+        if hosts:
+            return await hosts.open(token)
+        return await setup_browser(token, run_mode=run_mode)
+
+    started = time.perf_counter()
+    opened = await asyncio.gather(*(open_account(token) for token in tokens), return_exceptions=True)
+    open_ms = (time.perf_counter() - started) * 1000
+    sessions = [(token, *result) for token, result in zip(tokens, opened) if not isinstance(result, BaseException)]
+    errors = [str(result) for result in opened if isinstance(result, BaseException)]
+
+    try:
+        # Renderers keep allocating for a moment after the page has loaded
+        await asyncio.sleep(settle)
+        processes, memory_mb = browser_memory()
+        checks = await asyncio.gather(*(isolated(page, token) for token, _, page in sessions), return_exceptions=True)
+        browsers = len({id(browser) for _, browser, _ in sessions})
+    finally:
+        if hosts:
+            for _, browser, page in sessions:
+                await hosts.close(browser, page)
+            hosts.stop()
+        else:
+            for _, browser, _ in sessions:
+                browser.stop()
+        # Give Chrome a moment to exit so the next model starts from zero
+        await asyncio.sleep(2)
+
+    return {
+        "accounts": len(sessions),
+        "browsers": browsers,
+        "processes": processes,
+        "memoryMb": round(memory_mb, 1),
+        "perAccountMb": round(memory_mb / len(sessions), 1) if sessions else None,
+        "openMs": round(open_ms, 1),
+        "isolated": bool(sessions) and all(check is True for check in checks),
+        "errors": errors,
+    }
+
+
+async def run(args):
+    tokens = [f'bench-memory-{i}' for i in range(args.accounts)]
+    results = {}
+    for model in args.models:
+        print(f"Opening {len(tokens)} accounts ({model})...", file=sys.stderr)
+        results[model] = stats = await measure(model, tokens, args.accounts_per_browser, args.run_mode, args.settle)
+        print(
+            f"  {stats['browsers']} browser(s), {stats['processes']} processes, {stats['memoryMb']} MB "
+            f"({stats['perAccountMb']} MB/account), isolated: {stats['isolated']}",
+            file=sys.stderr
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory per account: a Chrome each against shared browser contexts')
+    parser.add_argument('--accounts', type=int, default=8, help='Accounts open at the same time')
+    parser.add_argument('--accounts-per-browser', type=int, help='Contexts per Chrome in the contexts model (default: all accounts)')
+    parser.add_argument('--models', default=','.join(MODELS), help='Comma-separated models to measure')
+    parser.add_argument('--run-mode', default='headless', help='Run mode of the browsers (see display.py)')
+    parser.add_argument('--settle', type=float, default=3, help='Seconds to wait after opening before sampling')
+    parser.add_argument('--x-base-url', help='Use an already running x.com stand-in instead of starting one')
+    args = parser.parse_args()
+
+    args.models = [m.strip() for m in args.models.split(',') if m.strip()]
+    unknown = [m for m in args.models if m not in MODELS]
+    if unknown:
+        parser.error(f"unknown model(s): {', '.join(unknown)}")
+    if not os.path.isdir('/proc/self'):
+        parser.error("needs /proc to read process memory (Linux)")
+    args.accounts = max(1, args.accounts)
+    args.accounts_per_browser = max(1, args.accounts_per_browser or args.accounts)
+
+    x_base = args.x_base_url or serve(XStandIn)[1]
+    with tempfile.TemporaryDirectory(prefix='xactions-bench-') as scratch:
+        # utils reads these at import time, so they are set before it is imported
+        os.environ.update({
+            "XACTIONS_X_BASE_URL": x_base,
+            "XACTIONS_CACHE_DIR": os.path.join(scratch, 'cache'),
+            "XACTIONS_PROFILE_DIR": os.path.join(scratch, 'profiles'),
+        })
+        sys.path.insert(0, ACTIONS_DIR)
+        results = asyncio.run(run(args))
+
+    summary = {
+        "success": True,
+        "xBaseUrl": x_base,
+        "accounts": args.accounts,
+        "accountsPerBrowser": args.accounts_per_browser,
+        "runMode": args.run_mode,
+        "models": results,
+    }
+    if all(model in results for model in MODELS) and results['process']['memoryMb']:
+        summary["savedMb"] = round(results['process']['memoryMb'] - results['contexts']['memoryMb'], 1)
+        summary["ratio"] = round(results['contexts']['memoryMb'] / results['process']['memoryMb'], 2)
+    print(json.dumps(summary))
+
+
+if __name__ == '__main__':
+    main()
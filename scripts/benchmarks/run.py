@@ -0,0 +1,222 @@
+"""
+Offline end-to-end benchmarks for the Python scripts.
+
+Starts the local x.com and getdaytrends stand-ins (see standin.py), runs each
+script as Node does, one process per run, and times every run. Reports p50,
+p95 and throughput per scenario, with the median of each phase the script
+reported in "timings". Results are written as JSON so runs of different
+versions can be compared with --compare.
+
+Needs Chrome/Chromium for everything except the trends scenario, which uses
+the HTTP fast path.
+
+Usage (from scripts/):
+    python benchmarks/run.py
+    python benchmarks/run.py --scenarios post,trends --iterations 20 --concurrency 2
+    python benchmarks/run.py --compare benchmarks/results/previous.json
+    python benchmarks/run.py --x-base-url http://127.0.0.1:8700 --trends-base-url http://127.0.0.1:8701
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(BENCH_DIR)
+ACTIONS_DIR = os.path.join(SCRIPTS_DIR, 'twitter_actions')
+
+sys.path.insert(0, BENCH_DIR)
+from standin import XStandIn, TrendsStandIn, serve
+
+# name -> function(x_base_url, iteration) returning the script command line
+SCENARIOS = {
+    'post': lambda base, i: [
+        os.path.join(ACTIONS_DIR, 'nodriver_post.py'), '--token', 'bench', '--text', f'Benchmark post {i}'
+    ],
+    'reply': lambda base, i: [
+        os.path.join(ACTIONS_DIR, 'nodriver_reply.py'), '--token', 'bench',
+        '--target', f'{base}/standin/status/{i + 1}', '--text', f'Benchmark reply {i}'
+    ],
+    'quote': lambda base, i: [
+        os.path.join(ACTIONS_DIR, 'nodriver_quote.py'), '--token', 'bench',
+        '--target', f'{base}/standin/status/{i + 1}', '--text', f'Benchmark quote {i}'
+    ],
+    'check_suspension': lambda base, i: [
+        os.path.join(SCRIPTS_DIR, 'check_suspension.py'), '--token', 'bench', '--username', 'suspended_bench', '--no-cache'
+    ],
+    'trends': lambda base, i: [
+        os.path.join(SCRIPTS_DIR, 'trend_extractor.py'), '--action', 'trends', '--country', 'united-states', '--no-cache'
+    ],
+}
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a non-empty list."""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def parse_output(stdout):
+    """Parses the JSON result the way the Node callers do: first '{' to last '}'."""
+    match = re.search(r'\{[\s\S]*\}', stdout)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+
+
+def run_once(command, env, timeout):
+    started = time.perf_counter()
+    try:
+        proc = subprocess.run(
+            [sys.executable, *command], cwd=SCRIPTS_DIR, env=env,
+            capture_output=True, text=True, encoding='utf-8', timeout=timeout
+        )
+        result = parse_output(proc.stdout) or {"success": False, "error": (proc.stderr or 'no output').strip()[-300:]}
+    except subprocess.TimeoutExpired:
+        result = {"success": False, "error": f"Timed out after {timeout}s"}
+    return (time.perf_counter() - started) * 1000, result
+
+
+def run_scenario(name, x_base, env, iterations, concurrency, warmup, timeout):
+    build = SCENARIOS[name]
+    for i in range(warmup):
+        run_once(build(x_base, i), env, timeout)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        runs = list(executor.map(lambda i: run_once(build(x_base, i), env, timeout), range(iterations)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [ms for ms, _ in runs]
+    succeeded = [result for _, result in runs if result.get('success')]
+    phases = {}
+    for result in succeeded:
+        for phase, ms in (result.get('timings') or {}).items():
+            phases.setdefault(phase, []).append(ms)
+
+    return {
+        "runs": iterations,
+        "succeeded": len(succeeded),
+        "p50Ms": round(percentile(latencies, 50), 1),
+        "p95Ms": round(percentile(latencies, 95), 1),
+        "meanMs": round(sum(latencies) / len(latencies), 1),
+        "minMs": round(min(latencies), 1),
+        "maxMs": round(max(latencies), 1),
+        "throughputPerSec": round(iterations / elapsed, 3),
+        "phaseP50Ms": {phase: round(percentile(values, 50), 1) for phase, values in phases.items()},
+        "errors": sorted({r.get('error', 'unknown error') for _, r in runs if not r.get('success')})[:5],
+    }
+
+
+def git_version():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], cwd=SCRIPTS_DIR,
+            capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(current, previous):
+    """Prints the p50/p95 change of every scenario present in both result files."""
+    print(f"\nCompared with {previous.get('version') or 'previous run'}:", file=sys.stderr)
+    for name, stats in current['scenarios'].items():
+        old = previous.get('scenarios', {}).get(name)
+        if not old:
+            continue
+        changes = []
+        for key in ('p50Ms', 'p95Ms'):
+            if old.get(key):
+                changes.append(f"{key[:3]} {(stats[key] - old[key]) / old[key] * 100:+.1f}%")
+        print(f"  {name:<17} {'  '.join(changes)}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks against local x.com/getdaytrends stand-ins')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated scenarios to run')
+    parser.add_argument('--iterations', type=int, default=10, help='Timed runs per scenario')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed runs per scenario before timing')
+    parser.add_argument('--concurrency', type=int, default=1, help='Runs in flight at the same time')
+    parser.add_argument('--timeout', type=float, default=120, help='Seconds before a run is counted as failed')
+    parser.add_argument('--latency', type=float, default=0, help='Seconds the stand-ins add to every response')
+    parser.add_argument('--x-base-url', help='Use an already running x.com stand-in instead of starting one')
+    parser.add_argument('--trends-base-url', help='Use an already running getdaytrends stand-in instead of starting one')
+    parser.add_argument('--output', help='Result file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare', help='Earlier result file to compare against')
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.scenarios.split(',') if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    x_base = args.x_base_url or serve(XStandIn, latency=args.latency)[1]
+    trends_base = args.trends_base_url or serve(TrendsStandIn, latency=args.latency)[1]
+
+    with tempfile.TemporaryDirectory(prefix='xactions-bench-') as scratch:
+        env = {
+            **os.environ,
+            "XACTIONS_X_BASE_URL": x_base,
+            "XACTIONS_TRENDS_BASE_URL": trends_base,
+            "XACTIONS_CACHE_DIR": os.path.join(scratch, 'cache'),
+            "XACTIONS_PROFILE_DIR": os.path.join(scratch, 'profiles'),
+            # Every run uses the same account; pacing would measure the bucket, not the script
+            "XACTIONS_PACING": 'off',
+            "PYTHONIOENCODING": 'utf-8',
+        }
+
+        scenarios = {}
+        for name in names:
+            print(f"Running {name} x{args.iterations}...", file=sys.stderr)
+            scenarios[name] = stats = run_scenario(
+                name, x_base, env, args.iterations, args.concurrency, args.warmup, args.timeout
+            )
+            print(
+                f"  p50 {stats['p50Ms']} ms  p95 {stats['p95Ms']} ms  "
+                f"{stats['throughputPerSec']}/s  {stats['succeeded']}/{stats['runs']} ok",
+                file=sys.stderr
+            )
+
+    results = {
+        "version": git_version(),
+        "createdAt": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "xBaseUrl": x_base,
+        "trendsBaseUrl": trends_base,
+        "iterations": args.iterations,
+        "concurrency": args.concurrency,
+        "scenarios": scenarios,
+    }
+
+    output = args.output or os.path.join(
+        BENCH_DIR, 'results', datetime.now().strftime('%Y%m%d-%H%M%S') + '.json'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+    print(json.dumps({"success": True, "output": output, "scenarios": scenarios}))
+
+
+if __name__ == '__main__':
+    main()
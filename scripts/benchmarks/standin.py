@@ -0,0 +1,242 @@
+"""
+Local stand-ins for x.com and getdaytrends.com used by the offline benchmarks.
+
+The pages only reproduce what the scripts rely on: the data-testid elements
+of the composer, reply box, toast, profile header and empty states, the
+suspension and not-found texts, the media upload and CreateTweet GraphQL
+calls and the getdaytrends table and country dropdown. Point the scripts at a running
+stand-in with XACTIONS_X_BASE_URL and XACTIONS_TRENDS_BASE_URL.
+
+Accounts and profiles are driven by name: an auth_token starting with
+"suspended" gets the suspension banner on /home, usernames starting with
+"suspended" or "missing" get the matching empty state, and a status ID of
+"deleted" renders X's error page.
+
+Usage (from scripts/):
+    python benchmarks/standin.py --port 8700 --trends-port 8701
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+_tweet_ids = itertools.count(1_800_000_000_000_000_000)
+
+PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>%(title)s</title></head>
+<body>
+<nav><a data-testid="SideNav_NewTweet_Button" href="/compose/tweet">Post</a></nav>
+<main data-testid="primaryColumn">%(body)s</main>
+<div id="layers"></div>
+<script>%(script)s</script>
+</body></html>
+"""
+
+COMPOSER = """
+<div class="composer">
+  <div data-testid="tweetTextarea_0" aria-label="Post text" role="textbox" contenteditable="true"></div>
+  <input type="file" accept="image/jpeg,image/png,image/webp,image/gif,video/mp4" multiple style="display:none">
+  <div class="attachments-slot"></div>
+  <button data-testid="%(button)s" disabled>Post</button>
+</div>
+"""
+
+# Enables the button once there is text, uploads attached files with a
+# progress bar shown, posts through the same GraphQL operation X uses and
+# shows the "Your post was sent" toast with a link.
+COMPOSER_SCRIPT = """
+const area = document.querySelector('[data-testid="tweetTextarea_0"]');
+const button = document.querySelector('[data-testid^="tweetButton"]');
+const fileInput = document.querySelector('input[type="file"]');
+const sync = () => area.textContent.trim() ? button.removeAttribute('disabled') : button.setAttribute('disabled', '');
+area.addEventListener('input', sync);
+new MutationObserver(sync).observe(area, {childList: true, characterData: true, subtree: true});
+fileInput.addEventListener('change', async () => {
+  button.setAttribute('disabled', '');
+  const slot = document.querySelector('.attachments-slot');
+  const count = fileInput.files.length;
+  slot.innerHTML = '<div data-testid="attachments">' + count + ' file(s)<div role="progressbar"></div></div>';
+  for (const file of fileInput.files) {
+    await fetch('/i/media/upload.json?command=APPEND', {method: 'POST', body: file});
+  }
+  setTimeout(() => {
+    slot.innerHTML = '<div data-testid="attachments">' + count + ' file(s)</div>';
+    sync();
+  }, %(upload_ms)d);
+});
+const submit = async () => {
+  if (button.hasAttribute('disabled')) return;
+  const text = area.textContent;
+  const response = await fetch('/i/api/graphql/standin/CreateTweet', {
+    method: 'POST',
+    headers: {'content-type': 'application/json'},
+    body: JSON.stringify({variables: {tweet_text: text}})
+  });
+  const data = await response.json();
+  const id = data.data.create_tweet.tweet_results.result.rest_id;
+  area.textContent = '';
+  sync();
+  document.getElementById('layers').innerHTML =
+    '<div data-testid="toast">Your post was sent. <a href="/standin/status/' + id + '">View</a></div>';
+};
+button.addEventListener('click', submit);
+area.addEventListener('keydown', (e) => { if (e.key === 'Enter' && e.ctrlKey) submit(); });
+"""
+
+
+class XStandIn(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0
+    upload_ms = 150
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        path = urlsplit(self.path).path.rstrip('/') or '/'
+        parts = path.strip('/').split('/')
+        token = self._auth_token()
+
+        if path == '/':
+            return self._page('X', '<h1>X</h1>')
+        if path == '/i/flow/login':
+            return self._page('Log in to X', '<h1>Sign in to X</h1>')
+        if path in ('/home', '/compose/tweet', '/account/access') and not token:
+            return self._redirect('/i/flow/login?redirect_after_login=' + path)
+        if path == '/home':
+            banner = ''
+            if token.startswith('suspended'):
+                banner = '<div role="alert">To unlock your account, follow the steps below.</div>'
+            return self._composer('Home', banner, 'tweetButtonInline')
+        if path == '/compose/tweet':
+            return self._composer('Compose', '', 'tweetButton')
+        if len(parts) == 3 and parts[1] == 'status':
+            if parts[2] == 'deleted':
+                return self._page('Post', '<div class="errorContainer">Hmm...this page doesn’t exist.</div>')
+            tweet = f'<article data-testid="tweet"><div data-testid="tweetText">Post {parts[2]}</div></article>'
+            return self._composer('Post', tweet, 'tweetButtonInline')
+        if len(parts) == 1:
+            return self._profile(parts[0])
+
+        self._send(404, 'text/plain', b'Not found')
+
+    def do_POST(self):
+        time.sleep(self.latency)
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        path = urlsplit(self.path).path
+        if path == '/i/media/upload.json':
+            return self._send(200, 'application/json', json.dumps({"media_id_string": str(next(_tweet_ids))}).encode())
+        if not path.endswith('/CreateTweet'):
+            return self._send(404, 'text/plain', b'Not found')
+
+        body = {"data": {"create_tweet": {"tweet_results": {"result": {"rest_id": str(next(_tweet_ids))}}}}}
+        self._send(200, 'application/json', json.dumps(body).encode())
+
+    def _profile(self, username):
+        if username.startswith('suspended'):
+            body = '<div data-testid="emptyState">Account suspended</div>'
+        elif username.startswith('missing'):
+            body = '<div data-testid="emptyState">This account doesn’t exist</div>'
+        else:
+            body = f'<div data-testid="UserName">{username} @{username}</div>'
+        self._page(username, body)
+
+    def _composer(self, title, before, button):
+        script = COMPOSER_SCRIPT % {"upload_ms": self.upload_ms}
+        self._page(title, before + COMPOSER % {"button": button}, script)
+
+    def _page(self, title, body, script=''):
+        html = PAGE % {"title": title, "body": body, "script": script}
+        self._send(200, 'text/html; charset=utf-8', html.encode('utf-8'))
+
+    def _redirect(self, location):
+        self.send_response(302)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _auth_token(self):
+        cookie = SimpleCookie(self.headers.get('Cookie') or '')
+        return cookie['auth_token'].value if 'auth_token' in cookie else ''
+
+
+COUNTRIES = ['united-states', 'united-kingdom', 'saudi-arabia', 'egypt', 'japan', 'brazil', 'india', 'germany']
+
+TRENDS_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Trends</title></head>
+<body>
+<div id="dropdown-areas">%(areas)s</div>
+<table class="table"><tbody>%(rows)s</tbody></table>
+</body></html>
+"""
+
+
+class TrendsStandIn(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        slug = urlsplit(self.path).path.strip('/') or 'worldwide'
+        if slug != 'worldwide' and slug not in COUNTRIES:
+            body = b'Not found'
+            self.send_response(404)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        areas = ''.join(f'<a href="/{c}/">{c.replace("-", " ").title()}</a>' for c in COUNTRIES)
+        rows = ''.join(
+            f'<tr><th>{rank}</th><td><a class="string" href="/trend/{slug}-{rank}/">#{slug}{rank}</a>'
+            f'<div class="small text-muted">{(51 - rank) * 1000} tweets</div></td></tr>'
+            for rank in range(1, 51)
+        )
+        body = (TRENDS_PAGE % {"areas": areas, "rows": rows}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(handler, port=0, latency=0, **attrs):
+    """Starts `handler` on 127.0.0.1:`port` in a daemon thread. Returns (server, base_url)."""
+    handler = type(handler.__name__, (handler,), {"latency": latency, **attrs})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve local x.com and getdaytrends stand-ins')
+    parser.add_argument('--port', type=int, default=8700, help='Port of the x.com stand-in')
+    parser.add_argument('--trends-port', type=int, default=8701, help='Port of the getdaytrends stand-in')
+    parser.add_argument('--latency', type=float, default=0, help='Seconds added to every response')
+    args = parser.parse_args()
+
+    _, x_base = serve(XStandIn, args.port, args.latency)
+    trends_server, trends_base = serve(TrendsStandIn, args.trends_port, args.latency)
+    print(f'XACTIONS_X_BASE_URL={x_base}')
+    print(f'XACTIONS_TRENDS_BASE_URL={trends_base}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
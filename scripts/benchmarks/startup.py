@@ -0,0 +1,103 @@
+"""
+Interpreter startup and import cost of every xactions_py command.
+
+Runs `python -X importtime -m xactions_py <command> --help` in fresh
+processes, which imports everything the command needs and exits before any
+browser or network work. Reports per command the median wall time, the
+median import time and how much of it nodriver accounts for, next to the
+bare --help/--version paths.
+
+Usage (from scripts/):
+    python benchmarks/startup.py
+    python benchmarks/startup.py --commands post,trends --iterations 20
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.insert(0, SCRIPTS_DIR)
+from xactions_py.__main__ import COMMANDS
+
+# "import time: self [us] | cumulative | imported package"
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def import_times(stderr):
+    """
+    Microseconds spent importing in total (top-level imports) and in nodriver,
+    wherever it was first imported from.
+    """
+    total = nodriver = 0
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        # Nested imports are indented below their importer; top-level ones have one space
+        if len(match.group(3)) == 1:
+            total += int(match.group(2))
+        if match.group(4) == 'nodriver':
+            nodriver = int(match.group(2))
+    return total, nodriver
+
+
+def run_once(args):
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', 'xactions_py', *args],
+        cwd=SCRIPTS_DIR, capture_output=True, text=True, encoding='utf-8'
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    total_us, nodriver_us = import_times(proc.stderr)
+    return wall_ms, total_us / 1000, nodriver_us / 1000
+
+
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def measure(args, iterations):
+    runs = [run_once(args) for _ in range(iterations)]
+    return {
+        "wallMs": round(median([r[0] for r in runs]), 1),
+        "importMs": round(median([r[1] for r in runs]), 1),
+        "nodriverMs": round(median([r[2] for r in runs]), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup and import cost per xactions_py command')
+    parser.add_argument('--commands', default=','.join(COMMANDS), help='Comma-separated commands to measure')
+    parser.add_argument('--iterations', type=int, default=5, help='Fresh processes per command')
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.commands.split(',') if n.strip()]
+    unknown = [n for n in names if n not in COMMANDS]
+    if unknown:
+        parser.error(f"unknown command(s): {', '.join(unknown)}")
+
+    targets = {'--version': ['--version'], '--help': ['--help']}
+    targets.update({name: [name, '--help'] for name in names})
+
+    results = {}
+    for name, command in targets.items():
+        results[name] = stats = measure(command, max(1, args.iterations))
+        print(
+            f"  {name:<17} wall {stats['wallMs']:>7} ms  imports {stats['importMs']:>7} ms  "
+            f"nodriver {stats['nodriverMs']:>7} ms",
+            file=sys.stderr
+        )
+
+    print(json.dumps({"success": True, "python": sys.version.split()[0], "commands": results}))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,146 +1,251 @@
 import asyncio
 import sys
+import os
 import json
 import nodriver as uc
 import argparse
+import time
+from datetime import datetime, timezone
 
-async def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--token', required=True, help='Twitter auth_token')
-    parser.add_argument('--username', required=True, help='Twitter username to check')
-    args = parser.parse_args()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'twitter_actions'))
+from waits import wait_for_selector, wait_for_navigation, wait_for_network_idle, evaluate_value
+from cache import TTLCache
+from blocking import RequestBlocker
+from utils import profile_dir, has_auth_cookie, inject_auth_cookie, is_logged_out_url, x_url, X_HOST, close_context
+from utils import error_response, print_result, start_timings, phase, export_timings, add_timing_arguments
 
-    auth_token = args.token
-    username = args.username.strip('@')
+# Seconds a cached verdict stays valid, per outcome. Active accounts can be
+# suspended at any time, so that verdict expires soonest.
+VERDICT_TTL = {
+    "suspended": 6 * 3600,
+    "active": 3600,
+    "missing": 24 * 3600,
+}
 
-    browser = None
-    try:
-        # Start browser in headless mode since user doesn't need to interact
-        browser = await uc.start(headless=True)
-        
-        # Navigate to set the cookie
-        page = await browser.get('https://x.com')
-        
-        # Create cookie object and set it
-        await page.send(uc.cdp.network.set_cookie(
-            name='auth_token',
-            value=auth_token,
-            domain='.x.com',
-            path='/',
-            secure=True,
-            http_only=True
-        ))
-
-        # STRATEGY 1: Navigate direct to home feed. Permanently suspended accounts often show a bright banner here without redirecting.
-        home_url = 'https://x.com/home'
-        await page.get(home_url)
-        
-        # Wait for home content
-        await asyncio.sleep(6)
-        
-        # Check current URL, sometimes Twitter redirects locked accounts
-        current_url = await page.evaluate('window.location.href')
-        
-        if 'twitter.com/account/access' in current_url or 'x.com/account/access' in current_url:
-            # This is a locked/suspended account wall
-            print(json.dumps({
-                "success": True,
-                "username": username,
-                "isSuspended": True,
-                "doesNotExist": False
-            }))
-            return
+# Texts X shows on suspended / locked accounts and on missing profiles, per locale.
+# Matching is a case-sensitive substring search of the page's visible text.
+SUSPENSION_PHRASES = {
+    'en': [
+        "Account suspended",
+        "Twitter suspends accounts",
+        "This account has been suspended",
+        "Suspended",
+        "To unlock your account",
+        "your account is suspended",
+        "Permanently suspended",
+    ],
+    'ar': [
+        "موقوف",
+        "يوقف حسابات",
+        "لإلغاء قفل حسابك",
+        "تم إيقاف حسابك",
+        "موقوف نهائياً",
+        "حسابك في وضع القراءة فقط بشكل دائم",
+        "بعد مراجعة متأنية، قرّرنا أن حسابك انتهك قوانين X",
+    ],
+}
 
-        # Check for multiple variations of suspension text on the home page itself
-        home_text = await page.evaluate('document.body.innerText')
-        home_content = str(home_text) if home_text else ""
-        
-        suspension_texts = [
-            "Account suspended",
-            "موقوف",
-            "Twitter suspends accounts",
-            "This account has been suspended",
-            "يوقف حسابات",
-            "Suspended",
-            "To unlock your account",
-            "your account is suspended",
-            "لإلغاء قفل حسابك",
-            "تم إيقاف حسابك",
-            "Permanently suspended",
-            "موقوف نهائياً",
-            "حسابك في وضع القراءة فقط بشكل دائم",
-            "بعد مراجعة متأنية، قرّرنا أن حسابك انتهك قوانين X"
-        ]
-        
-        for text in suspension_texts:
-            if text in home_content:
-                print(json.dumps({
-                    "success": True,
-                    "username": username,
-                    "isSuspended": True,
-                    "doesNotExist": False
-                }))
-                return
-
-        # STRATEGY 2: Navigate to specific profile page, to catch stealthy profile-only suspensions
-        profile_url = f'https://x.com/{username}'
-        await page.get(profile_url)
-        
-        # Wait for profile content
-        await asyncio.sleep(5)
+NOT_FOUND_PHRASES = {
+    'en': [
+        "This account doesn’t exist",
+        "This account doesn't exist",
+        "Something went wrong, but don’t fret",
+    ],
+    'ar': [
+        "هذا الحساب غير موجود",
+        "حدث خطأ ما",
+    ],
+}
+
+# Compiles each phrase group into one regex inside the page and returns only
+# the first matched phrase per signal, so the page text never crosses CDP.
+_MATCH_SCRIPT = r"""
+(() => {
+    const groups = %s;
+    const text = document.body ? document.body.innerText : '';
+    const escape = (p) => p.replace(/[.*+?^${}()|[\]\\]/g, '\\$&');
+    const verdict = {};
+    for (const [signal, phrases] of Object.entries(groups)) {
+        const match = phrases.length ? text.match(new RegExp(phrases.map(escape).join('|'))) : null;
+        verdict[signal] = match ? match[0] : null;
+    }
+    return verdict;
+})()
+"""
+
+
+def _flatten(groups):
+    return [phrase for phrases in groups.values() for phrase in phrases]
 
-        # Check for multiple variations of suspension text by getting all text on the page natively
-        page_text = await page.evaluate('document.body.innerText')
-        page_content = str(page_text) if page_text else ""
-        
-        is_suspended = False
-        suspension_texts = [
-            "Account suspended",
-            "موقوف",
-            "Twitter suspends accounts",
-            "This account has been suspended",
-            "يوقف حسابات",
-            "Suspended",
-            "To unlock your account",
-            "your account is suspended",
-            "لإلغاء قفل حسابك",
-            "تم إيقاف حسابك",
-            "حسابك في وضع القراءة فقط بشكل دائم",
-            "بعد مراجعة متأنية، قرّرنا أن حسابك انتهك قوانين X"
-        ]
-        
-        for text in suspension_texts:
-            if text in page_content:
-                is_suspended = True
-                break
-                
-        # To be extra safe, let's also check if the account doesn't exist
-        does_not_exist = False
-        not_exist_texts = [
-           "This account doesn’t exist",
-           "هذا الحساب غير موجود",
-           "This account doesn't exist",
-           "Something went wrong, but don’t fret",
-           "حدث خطأ ما"
-        ]
-        
-        for text in not_exist_texts:
-            if text in page_content:
-                does_not_exist = True
-                break
 
-        print(json.dumps({
+async def match_page_text(page):
+    """Returns {"suspended": phrase or None, "notFound": phrase or None} for the current page."""
+    groups = {
+        "suspended": _flatten(SUSPENSION_PHRASES),
+        "notFound": _flatten(NOT_FOUND_PHRASES),
+    }
+    verdict = await evaluate_value(page, _MATCH_SCRIPT % json.dumps(groups, ensure_ascii=False))
+    return verdict or {"suspended": None, "notFound": None}
+
+async def check_account(page, auth_token, username, persistent=False):
+    """
+    Runs the home feed and profile checks for one account on `page`. The auth
+    cookie is set unless the browser profile already holds a working session
+    for this token; with persistent=True it is stored in the profile for the
+    next check. Returns the verdict.
+    """
+    warm = await has_auth_cookie(page, auth_token)
+    if not warm:
+        await inject_auth_cookie(page, auth_token, persistent=persistent)
+    phase('cookieInject')
+
+    # STRATEGY 1: Navigate direct to home feed. Permanently suspended accounts often show a bright banner here without redirecting.
+    home_url = x_url('/home')
+    await page.get(home_url)
+    current_url = await wait_for_navigation(page, timeout=6)
+
+    if warm and is_logged_out_url(current_url):
+        # The stored session expired: start over with the token
+        await page.send(uc.cdp.network.clear_browser_cookies())
+        await inject_auth_cookie(page, auth_token, persistent=persistent)
+        await page.get(home_url)
+        current_url = await wait_for_navigation(page, timeout=6)
+    
+    # Wait for home content: the main column, then for the timeline requests to settle
+    await wait_for_selector(page, '[data-testid="primaryColumn"]', timeout=6)
+    await wait_for_network_idle(page, idle_time=0.5, timeout=3, max_inflight=2)
+    
+    # Check current URL, sometimes Twitter redirects locked accounts
+    current_url = await page.evaluate('window.location.href') or current_url or ''
+    
+    if 'twitter.com/account/access' in current_url or f'{X_HOST}/account/access' in current_url:
+        phase('homeCheck')
+        # This is a locked/suspended account wall
+        return {
+            "success": True,
+            "username": username,
+            "isSuspended": True,
+            "doesNotExist": False
+        }
+
+    # Check for multiple variations of suspension text on the home page itself
+    verdict = await match_page_text(page)
+    phase('homeCheck')
+    if verdict['suspended']:
+        return {
             "success": True,
             "username": username,
-            "isSuspended": is_suspended,
-            "doesNotExist": does_not_exist
-        }))
+            "isSuspended": True,
+            "doesNotExist": False,
+            "signal": verdict['suspended']
+        }
+
+    # STRATEGY 2: Navigate to specific profile page, to catch stealthy profile-only suspensions
+    profile_url = x_url(f'/{username}')
+    await page.get(profile_url)
+    
+    # Wait for profile content: a rendered profile header, or the empty state
+    # X shows for suspended and missing accounts
+    await wait_for_selector(page, '[data-testid="UserName"], [data-testid="emptyState"]', timeout=5)
+    await wait_for_network_idle(page, idle_time=0.3, timeout=2, max_inflight=2)
+
+    # Check for suspension and does-not-exist texts in one in-page pass
+    verdict = await match_page_text(page)
+    phase('profileCheck')
+    is_suspended = bool(verdict['suspended'])
+    does_not_exist = bool(verdict['notFound'])
+
+    return {
+        "success": True,
+        "username": username,
+        "isSuspended": is_suspended,
+        "doesNotExist": does_not_exist,
+        "signal": verdict['suspended'] or verdict['notFound']
+    }
+
+
+def _verdict_kind(result):
+    if result.get('doesNotExist'):
+        return "missing"
+    return "suspended" if result.get('isSuspended') else "active"
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+def open_cache():
+    try:
+        return TTLCache('suspension')
+    except Exception as e:
+        print(f"Suspension cache unavailable, checking live: {str(e)}", file=sys.stderr)
+        return None
+
+
+def cached_verdict(cache, username, max_age=None):
+    """Returns the cached verdict for username, marked cached, or None."""
+    if not cache:
+        return None
+    try:
+        hit = cache.get(username.lower(), max_age)
+    except Exception:
+        return None
+    if not hit:
+        return None
+    result, stored_at = hit
+    return {**result, "cached": True, "checkedAt": _iso(stored_at)}
+
+
+def store_verdict(cache, result):
+    """Caches a successful live verdict and returns it marked not cached."""
+    if not result.get('success'):
+        return result
+    checked_at = time.time()
+    if cache:
+        try:
+            checked_at = cache.set(result['username'].lower(), result, VERDICT_TTL[_verdict_kind(result)])
+        except Exception:
+            pass
+    return {**result, "cached": False, "checkedAt": _iso(checked_at)}
+
+
+def _with_network(result, blocker):
+    return {**result, "network": blocker.stats()} if blocker else result
+
+
+async def check_single(auth_token, username, cache=None, use_cached=True, max_age=None, block_resources=False,
+                       persistent=False):
+    start_timings()
+    hit = cached_verdict(cache, username, max_age) if use_cached else None
+    phase('cacheLookup')
+    if hit:
+        print_result(hit)
+        return
+
+    browser = None
+    try:
+        # Start browser in headless mode since user doesn't need to interact.
+        # A persistent profile keeps the session and HTTP cache between checks.
+        if persistent:
+            browser = await uc.start(headless=True, user_data_dir=profile_dir(auth_token))
+        else:
+            browser = await uc.start(headless=True)
+        phase('browserLaunch')
+        
+        blocker = RequestBlocker.from_profile('check_suspension') if block_resources else None
+        if blocker or persistent:
+            page = await browser.get('about:blank')
+        if blocker:
+            await blocker.attach(page)
+
+        if not persistent:
+            # Navigate to set the cookie
+            page = await browser.get(x_url())
+        result = store_verdict(cache, await check_account(page, auth_token, username, persistent=persistent))
+        print_result(_with_network(result, blocker))
 
     except Exception as e:
-        print(json.dumps({
-            "success": False,
-            "error": str(e)
-        }))
+        print_result(error_response(str(e)))
     finally:
         try:
             if browser:
@@ -148,5 +253,153 @@ async def main():
         except:
             pass
 
+
+def parse_batch_line(line):
+    """Returns (token, username) from one batch line, or raises ValueError saying what is wrong with it."""
+    if line.startswith('{'):
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"invalid JSON: {e.msg}")
+        if not isinstance(item, dict):
+            raise ValueError('expected a JSON object with "token" and "username"')
+        token, username = item.get('token'), item.get('username')
+        if not isinstance(token, str) or not isinstance(username, str):
+            raise ValueError('"token" and "username" must both be strings')
+    else:
+        parts = line.replace(',', ' ').split(None, 1)
+        if len(parts) != 2:
+            raise ValueError('expected "token,username"')
+        token, username = parts
+
+    token, username = token.strip(), username.strip()
+    if not token or not username.strip('@'):
+        raise ValueError('token and username must not be empty')
+    return token, username
+
+
+def read_batch(path):
+    """
+    Reads token/username pairs, one per line, from a file or '-' for stdin.
+    Lines are either JSON objects ({"token": ..., "username": ...}) or
+    "token,username" / "token username".
+    Returns (accounts, errors): a line that cannot be read becomes an error
+    record with its line number instead of failing the whole batch.
+    """
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        accounts = []
+        errors = []
+        for number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                accounts.append(parse_batch_line(line))
+            except ValueError as e:
+                errors.append({"success": False, "line": number, "error": f"Invalid batch line: {str(e)}"})
+        return accounts, errors
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+async def check_batch(accounts, concurrency, cache=None, use_cached=True, max_age=None, block_resources=False):
+    """
+    Checks many accounts in one browser, each in its own browser context so
+    auth cookies never mix. Prints one JSON line per account as it finishes;
+    cached verdicts are printed first, and the browser is only started if
+    something is left to check.
+    """
+    pending = []
+    for auth_token, username in accounts:
+        username = username.strip('@')
+        hit = cached_verdict(cache, username, max_age) if use_cached else None
+        if hit:
+            print_result(hit)
+        else:
+            pending.append((auth_token, username))
+
+    if not pending:
+        return
+
+    try:
+        browser = await uc.start(headless=True)
+    except Exception as e:
+        # Still one line per account, as for any other failure
+        for _, username in pending:
+            print_result({"success": False, "username": username, "error": f"Failed to start browser: {str(e)}"})
+        return
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(auth_token, username):
+        async with semaphore:
+            start_timings()
+            page = None
+            blocker = RequestBlocker.from_profile('check_suspension') if block_resources else None
+            try:
+                page = await browser.create_context('about:blank', new_window=True)
+                if blocker:
+                    await blocker.attach(page)
+                await page.get(x_url())
+                result = _with_network(store_verdict(cache, await check_account(page, auth_token, username)), blocker)
+            except Exception as e:
+                result = {
+                    "success": False,
+                    "username": username,
+                    "error": str(e)
+                }
+            finally:
+                if page:
+                    await close_context(browser, page)
+            print_result(result)
+
+    try:
+        await asyncio.gather(*(run(token, username) for token, username in pending))
+    finally:
+        try:
+            browser.stop()
+        except:
+            pass
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--token', help='Twitter auth_token')
+    parser.add_argument('--username', help='Twitter username to check')
+    parser.add_argument('--batch', help='File with one "token,username" or JSON object per line ("-" for stdin)')
+    parser.add_argument('--concurrency', type=int, default=3, help='Accounts checked at the same time in batch mode')
+    parser.add_argument('--max-age', type=float, help='Accept cached verdicts up to this many seconds old, instead of the per-verdict TTL')
+    parser.add_argument('--no-cache', action='store_true', help='Always check live (the fresh verdict is still cached)')
+    parser.add_argument('--block-resources', action='store_true', help='Skip images, video, fonts and analytics while checking')
+    parser.add_argument('--persistent-profile', action='store_true', help='Keep a Chrome profile per account so later checks start logged in')
+    add_timing_arguments(parser)
+    args = parser.parse_args()
+    if args.timings_file:
+        export_timings(args.timings_file, args.timings_format)
+
+    cache = open_cache()
+    options = dict(cache=cache, use_cached=not args.no_cache, max_age=args.max_age, block_resources=args.block_resources)
+
+    if args.batch:
+        if args.persistent_profile:
+            # A profile belongs to a whole browser; batch mode shares one browser between accounts
+            parser.error('--persistent-profile only applies to single-account checks')
+        try:
+            accounts, errors = read_batch(args.batch)
+        except OSError as e:
+            print_result(error_response(f"Could not read batch: {str(e)}"))
+            return
+        for error in errors:
+            print_result(error)
+        await check_batch(accounts, args.concurrency, **options)
+        return
+
+    if not args.token or not args.username:
+        parser.error('--token and --username are required unless --batch is given')
+
+    await check_single(args.token, args.username.strip('@'), persistent=args.persistent_profile, **options)
+
+
 if __name__ == '__main__':
     asyncio.run(main())
@@ -1,81 +1,171 @@
+"""
+Interactive login: opens X's login page and prints the auth_token once the
+user has signed in.
+
+Completion comes from CDP events instead of polling the cookie jar: a
+response whose Set-Cookie carries auth_token, or the tab reaching /home,
+triggers one cookie read. The account name is read as soon as the side nav
+renders.
+
+With --count N, N login windows open in one browser, each in its own browser
+context with its own cookie jar, so several accounts can sign in at the same
+time. The output then lists one result per window under "accounts".
+"""
 import asyncio
+import argparse
 import sys
-import json
+import os
 import nodriver as uc
 
-async def main():
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'twitter_actions'))
+from utils import success_response, error_response, print_result, start_timings, phase, export_timings, add_timing_arguments, x_url
+from waits import wait_for_selector, evaluate_value
+
+LOGIN_TIMEOUT = 300
+ACCOUNT_SWITCHER = '[data-testid="SideNav_AccountSwitcher_Button"]'
+
+
+async def read_auth_cookie(page):
+    """Returns the auth_token cookie of the page's browser context, or None."""
+    cookies = await page.send(uc.cdp.network.get_cookies(urls=[x_url()]))
+    for cookie in cookies:
+        if getattr(cookie, 'name', '') == 'auth_token' and getattr(cookie, 'value', ''):
+            return cookie.value
+    return None
+
+
+async def wait_for_login(page, timeout=LOGIN_TIMEOUT):
+    """Waits until the user has signed in on `page`. Returns the auth_token, or None on timeout."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    signal = asyncio.Event()
+
+    def on_headers(event):
+        headers = {key.lower(): value for key, value in (event.headers or {}).items()}
+        if 'auth_token=' in str(headers.get('set-cookie', '')):
+            signal.set()
+
+    def on_navigated(event):
+        # X moves to /home with history.pushState, which only fires NavigatedWithinDocument
+        url = event.url if hasattr(event, 'url') else event.frame.url
+        if '/home' in url:
+            signal.set()
+
+    handlers = (
+        (uc.cdp.network.ResponseReceivedExtraInfo, on_headers),
+        (uc.cdp.page.FrameNavigated, on_navigated),
+        (uc.cdp.page.NavigatedWithinDocument, on_navigated),
+    )
+    for event_type, handler in handlers:
+        page.add_handler(event_type, handler)
+
+    try:
+        await page.send(uc.cdp.network.enable())
+        await page.send(uc.cdp.page.enable())
+        while True:
+            # Cleared before reading so an event arriving meanwhile is not lost
+            signal.clear()
+            try:
+                auth_token = await read_auth_cookie(page)
+            except Exception:
+                auth_token = None
+            if auth_token:
+                return auth_token
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            try:
+                await asyncio.wait_for(signal.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return None
+    finally:
+        for event_type, handler in handlers:
+            page.remove_handler(event_type, handler)
+
+
+async def read_account_name(page, timeout=15):
+    """Returns "Name (@handle)" from the side nav account switcher, or None."""
+    if not await wait_for_selector(page, ACCOUNT_SWITCHER, timeout=timeout):
+        return None
+    try:
+        text = await evaluate_value(
+            page, f"(document.querySelector('{ACCOUNT_SWITCHER}') || {{}}).innerText || ''"
+        )
+    except Exception:
+        return None
+
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    if not lines:
+        return None
+    handle = next((line for line in lines[1:] if line.startswith('@')), lines[1] if len(lines) > 1 else '')
+    return f"{lines[0]} ({handle})"
+
+
+async def login(page):
+    auth_token = await wait_for_login(page)
+    if not auth_token:
+        return error_response("انتهت مهلة تسجيل الدخول. يرجى المحاولة مرة أخرى.")
+    phase('userLogin')
+
+    account_name = await read_account_name(page) or 'المحفظة الجديدة'
+    phase('accountName')
+    return success_response({
+        "token": auth_token,
+        "accountName": account_name
+    })
+
+
+async def login_window(browser):
+    """One login in a fresh browser context, with its own timings."""
+    start_timings()
+    page = await browser.create_context(x_url('/i/flow/login'), new_window=True)
+    phase('loginPage')
+    return await login(page)
+
+
+async def main(count=1):
+    start_timings()
+    browser = None
     try:
         # nodriver handles stealth automatically. Adding extra args usually causes it to crash and restart in a loop.
         browser = await uc.start(
             headless=False
         )
+        phase('browserLaunch')
 
-        page = await browser.get('https://x.com/i/flow/login')
-        
-        auth_token = None
-        account_name = None
-
-        # Poll for cookies (Timeout after 5 mins)
-        max_attempts = 300
-        attempts = 0
+        if count <= 1:
+            page = await browser.get(x_url('/i/flow/login'))
+            phase('loginPage')
+            return await login(page)
 
-        while attempts < max_attempts:
-            try:
-                cookies = await page.send(uc.cdp.network.get_cookies(urls=['https://x.com']))
-                for cookie in cookies:
-                    name = getattr(cookie, 'name', '')
-                    if name == 'auth_token':
-                        auth_token = getattr(cookie, 'value', '')
-                        break
-            except Exception as e:
-                pass
-            
-            if auth_token:
-                # Login succeeded, wait for DOM to load a bit and try to get the user name
-                await asyncio.sleep(5)
-                try:
-                    # Select the side nav profile button
-                    elem = await page.select('[data-testid="SideNav_AccountSwitcher_Button"]')
-                    if elem:
-                        text = elem.text
-                        if text:
-                            lines = text.split('\n')
-                            name = lines[0] if len(lines) > 0 else 'حساب تمت مصادقته'
-                            handle = lines[1] if len(lines) > 1 else ''
-                            account_name = f"{name} ({handle})"
-                except Exception as e:
-                    pass
-
-                if not account_name:
-                    account_name = 'المحفظة الجديدة'
-
-                print(json.dumps({
-                    "success": True,
-                    "token": auth_token,
-                    "accountName": account_name
-                }))
-                break
-                
-            await asyncio.sleep(1)
-            attempts += 1
-
-        if not auth_token:
-            print(json.dumps({
-                "success": False,
-                "error": "انتهت مهلة تسجيل الدخول. يرجى المحاولة مرة أخرى."
-            }))
+        results = await asyncio.gather(
+            *(asyncio.create_task(login_window(browser)) for _ in range(count)),
+            return_exceptions=True
+        )
+        accounts = [r if isinstance(r, dict) else error_response(str(r)) for r in results]
+        phase('logins')
+        return success_response({
+            "accounts": accounts,
+            "succeeded": sum(1 for a in accounts if a.get('success')),
+            "failed": sum(1 for a in accounts if not a.get('success')),
+        })
 
     except Exception as e:
-        print(json.dumps({
-            "success": False,
-            "error": str(e)
-        }))
+        return error_response(str(e))
     finally:
         try:
-            if 'browser' in locals() and browser:
+            if browser:
                 browser.stop()
         except:
             pass
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=1, help='Login windows to open at once, each with its own cookies')
+    add_timing_arguments(parser)
+    args = parser.parse_args()
+    if args.timings_file:
+        export_timings(args.timings_file, args.timings_format)
+
+    print_result(asyncio.run(main(args.count)))
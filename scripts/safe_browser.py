@@ -1,92 +1,226 @@
+"""
+Opens a logged-in browser (Twitter or Facebook) for manual use and exits as
+soon as the user closes it.
+
+Standalone (default): one Chrome per session, stopped when its last window
+is closed, when Chrome goes away or on SIGTERM/SIGINT.
+
+Shared: `--serve` starts one Chrome that sessions attach to and records its
+address in the profiles directory. `--attach` opens the session as its own
+browser context (separate cookies) in a new window of that Chrome, and
+disposes just that context when its windows are closed. A context costs a
+window and its renderers instead of a whole browser process tree.
+
+Usage:
+    python safe_browser.py --token_b64 ... --platform twitter
+    python safe_browser.py --serve
+    python safe_browser.py --token_b64 ... --platform facebook --attach
+    python safe_browser.py --token_b64 ... --attach 127.0.0.1:9222
+"""
 import asyncio
+import base64
+import json
+import os
+import re
+import signal
 import sys
 import argparse
 import nodriver as uc
-import time
-import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'twitter_actions'))
+from utils import inject_auth_cookie, browser_connection, x_url, PROFILES_DIR
+
+# Address of the Chrome started with --serve, for --attach without an address
+SHARED_STATE = os.path.join(PROFILES_DIR, 'shared-chrome.json')
+
+# Seconds between liveness checks; a crashed Chrome or a dropped connection sends no event
+LIVENESS_INTERVAL = 5
+
+
+async def open_platform(page, platform, auth_token):
+    """Injects the session cookies for `platform` into the page's context and opens its home page."""
+    if platform == 'facebook':
+        await page.get('https://facebook.com')
+        try:
+            c_user = ""
+            xs = ""
+            try:
+                cookies = json.loads(auth_token)
+                c_user = str(cookies.get('c_user', ''))
+                xs = str(cookies.get('xs', ''))
+            except json.JSONDecodeError:
+                c_match = re.search(r'c_user=([^;]+)', auth_token)
+                x_match = re.search(r'xs=([^;]+)', auth_token)
+                if c_match: c_user = c_match.group(1)
+                if x_match: xs = x_match.group(1)
+
+            if c_user:
+                await page.send(uc.cdp.network.set_cookie(
+                    name='c_user', value=c_user, domain='.facebook.com', path='/',
+                    secure=True, http_only=False
+                ))
+            if xs:
+                await page.send(uc.cdp.network.set_cookie(
+                    name='xs', value=xs, domain='.facebook.com', path='/',
+                    secure=True, http_only=True
+                ))
+        except Exception as e:
+            print(f"Failed to parse facebook cookies: {str(e)}")
+
+        await page.get('https://facebook.com/')
+
+    else: # Default Twitter
+        await page.get(x_url())
+        await inject_auth_cookie(page, auth_token)
+
+        # Navigate direct to home feed with the newly injected auth token
+        await page.get(x_url('/home'))
+
+
+async def has_windows(browser, context_id=None):
+    """True while Chrome answers and has a page open (in `context_id`, if given)."""
+    try:
+        targets = await asyncio.wait_for(browser_connection(browser).send(uc.cdp.target.get_targets()), timeout=5)
+    except Exception:
+        return False
+    return any(
+        t.type_ == 'page' and (context_id is None or t.browser_context_id == context_id)
+        for t in targets
+    )
+
+
+async def wait_until_closed(browser, context_id=None):
+    """
+    Returns once every page (of `context_id`, if given) is closed, Chrome has
+    gone away, or the process is asked to stop.
+    """
+    closed = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, closed.set)
+        except (NotImplementedError, RuntimeError, AttributeError):
+            # Windows: Ctrl+C still raises KeyboardInterrupt
+            pass
+
+    async def on_target_gone(event):
+        if not await has_windows(browser, context_id):
+            closed.set()
+
+    connection = browser_connection(browser)
+    events = (uc.cdp.target.TargetDestroyed, uc.cdp.target.TargetCrashed)
+    for event_type in events:
+        connection.add_handler(event_type, on_target_gone)
+
+    try:
+        await connection.send(uc.cdp.target.set_discover_targets(discover=True))
+        while not closed.is_set():
+            try:
+                await asyncio.wait_for(closed.wait(), timeout=LIVENESS_INTERVAL)
+            except asyncio.TimeoutError:
+                if not await has_windows(browser, context_id):
+                    return
+    finally:
+        for event_type in events:
+            connection.remove_handler(event_type, on_target_gone)
+
+
+async def run_standalone(auth_token, platform):
+    # Start browser in interactive mode (headless=False) so user can browse
+    browser = await uc.start(headless=False)
+    try:
+        page = await browser.get('about:blank')
+        await open_platform(page, platform, auth_token)
+
+        print("Browser session started successfully. Waiting for the window to close...")
+        sys.stdout.flush()
+
+        await wait_until_closed(browser)
+    finally:
+        # Whatever ended the session, do not leave Chrome behind
+        browser.stop()
+
+
+async def run_attached(auth_token, platform, address):
+    host, _, port = address.rpartition(':')
+    browser = await uc.start(host=host or '127.0.0.1', port=int(port))
+    # Disposed by Chrome as well if this process dies before cleaning up
+    page = await browser.create_context('about:blank', new_window=True, dispose_on_detach=True)
+    context_id = page.target.browser_context_id
+    try:
+        await open_platform(page, platform, auth_token)
+
+        print(f"Browser session started successfully in shared Chrome {address}. Waiting for the window to close...")
+        sys.stdout.flush()
+
+        await wait_until_closed(browser, context_id)
+    finally:
+        # Only this session's context goes away; the shared Chrome keeps running
+        try:
+            await browser_connection(browser).send(uc.cdp.target.dispose_browser_context(context_id))
+        except Exception:
+            pass
+        await browser_connection(browser).aclose()
+
+
+async def serve():
+    browser = await uc.start(headless=False)
+    address = f'{browser.config.host}:{browser.config.port}'
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    with open(SHARED_STATE, 'w', encoding='utf-8') as f:
+        json.dump({"address": address, "pid": os.getpid()}, f)
+    try:
+        print(f"Shared Chrome listening on {address}. Start sessions with --attach.")
+        sys.stdout.flush()
+        await wait_until_closed(browser)
+    finally:
+        try:
+            os.unlink(SHARED_STATE)
+        except OSError:
+            pass
+        browser.stop()
+
+
+def shared_address():
+    try:
+        with open(SHARED_STATE, encoding='utf-8') as f:
+            return json.load(f)['address']
+    except (OSError, ValueError, KeyError):
+        return None
+
 
 async def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--token', default='', help='auth_token or json cookie dict (raw)')
     parser.add_argument('--token_b64', default='', help='base64 encoded token')
     parser.add_argument('--platform', default='twitter', help='twitter or facebook')
+    parser.add_argument('--serve', action='store_true', help='Start a shared Chrome for --attach sessions')
+    parser.add_argument('--attach', nargs='?', const='auto', metavar='HOST:PORT',
+                        help='Open the session as a browser context in a shared Chrome (default: the one started with --serve)')
     args = parser.parse_args()
 
-    import base64
     if args.token_b64:
         auth_token = base64.b64decode(args.token_b64).decode('utf-8')
     else:
         auth_token = args.token
 
-    platform = args.platform
-
-    browser = None
     try:
-        # Start browser in interactive mode (headless=False) so user can browse
-        browser = await uc.start(headless=False)
-        
-        if platform == 'facebook':
-            page = await browser.get('https://facebook.com')
-            try:
-                c_user = ""
-                xs = ""
-                try:
-                    cookies = json.loads(auth_token)
-                    c_user = str(cookies.get('c_user', ''))
-                    xs = str(cookies.get('xs', ''))
-                except json.JSONDecodeError:
-                    import re
-                    c_match = re.search(r'c_user=([^;]+)', auth_token)
-                    x_match = re.search(r'xs=([^;]+)', auth_token)
-                    if c_match: c_user = c_match.group(1)
-                    if x_match: xs = x_match.group(1)
-                    
-                if c_user:
-                    await page.send(uc.cdp.network.set_cookie(
-                        name='c_user', value=c_user, domain='.facebook.com', path='/',
-                        secure=True, http_only=False
-                    ))
-                if xs:
-                    await page.send(uc.cdp.network.set_cookie(
-                        name='xs', value=xs, domain='.facebook.com', path='/',
-                        secure=True, http_only=True
-                    ))
-            except Exception as e:
-                print(f"Failed to parse facebook cookies: {str(e)}")
-            
-            await page.get('https://facebook.com/')
-            
-        else: # Default Twitter
-            page = await browser.get('https://x.com')
-            
-            # Create cookie object and set it
-            await page.send(uc.cdp.network.set_cookie(
-                name='auth_token',
-                value=auth_token,
-                domain='.x.com',
-                path='/',
-                secure=True,
-                http_only=True
-            ))
-
-            # Navigate direct to home feed with the newly injected auth token
-            await page.get('https://x.com/home')
-            
-        print("Browser session started successfully. Keeping alive...")
-        sys.stdout.flush()
+        if args.serve:
+            await serve()
+        elif args.attach:
+            address = shared_address() if args.attach == 'auto' else args.attach
+            if not address:
+                print("No shared Chrome found. Start one with --serve or pass --attach HOST:PORT.")
+                sys.exit(1)
+            await run_attached(auth_token, args.platform, address)
+        else:
+            await run_standalone(auth_token, args.platform)
 
-        # Keep script running infinitely so the browser window stays open for the user.
-        # If user manually closes the window, the script will naturally terminate eventually.
-        while True:
-            await asyncio.sleep(60)
+        print("Browser closed, exiting.")
 
     except Exception as e:
         print(f"Error launching safe browser: {str(e)}")
         sys.exit(1)
-    finally:
-        # Do not automatically close the browser here, unless it crashed.
-        # The user's whole goal is to use the browser manually.
-        pass
 
 if __name__ == '__main__':
     asyncio.run(main())
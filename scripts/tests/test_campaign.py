@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from campaign import build_steps, execute_steps
+from utils import x_url
+
+
+def run(content, fail=()):
+    """
+    Runs the steps of `content` with a fake run_step. Each step "creates" the
+    ID "id-<step>", unless its refId is in `fail`. Returns (results, calls).
+    """
+    calls = []
+
+    async def run_step(step, target):
+        calls.append((step['step'], target))
+        if step['refId'] in fail:
+            return {"success": False, "error": "boom"}
+        id_field = {'tweet': 'tweetId', 'reply': 'replyId', 'quote': 'quoteId'}[step['type']]
+        return {"success": True, id_field: f"id-{step['step']}"}
+
+    return asyncio.run(execute_steps(build_steps(content), run_step)), calls
+
+
+def test_references_resolve_to_created_ids():
+    results, calls = run({
+        "tweets": [{"text": "start", "refId": "t1"}],
+        "replies": [{"target": "{{t1}}", "text": "two", "refId": "r1"}],
+        "quotes": [{"target": "{{ r1 }}", "text": "look"}],
+    })
+    assert calls == [(0, None), (1, x_url('/i/status/id-0')), (2, x_url('/i/status/id-1'))]
+    assert [r['success'] for r in results] == [True, True, True]
+    assert results[2]['target'] == x_url('/i/status/id-1')
+
+
+def test_steps_run_in_dependency_order_and_report_in_campaign_order():
+    # Steps are built tweets, replies, quotes; this reply needs the quote after it
+    results, calls = run({
+        "tweets": [{"text": "plain"}],
+        "replies": [{"target": "{{q}}", "text": "reply to the quote"}],
+        "quotes": [{"target": "https://x.com/a/status/5", "text": "quote", "refId": "q"}],
+    })
+    assert calls == [(0, None), (2, "https://x.com/a/status/5"), (1, x_url('/i/status/id-2'))]
+    assert [r['step'] for r in results] == [0, 1, 2]
+    assert [r['type'] for r in results] == ['tweet', 'reply', 'quote']
+
+
+def test_unknown_ref_id_fails_only_that_step():
+    results, calls = run({
+        "tweets": [{"text": "ok"}],
+        "replies": [{"target": "{{missing}}", "text": "orphan"}],
+    })
+    assert results[0]['success'] is True
+    assert results[1]['success'] is False
+    assert 'Unknown refId: missing' in results[1]['error']
+    assert [step for step, _ in calls] == [0]
+
+
+def test_dependents_of_failed_steps_are_skipped():
+    results, calls = run({
+        "tweets": [{"text": "fails", "refId": "t1"}, {"text": "independent"}],
+        "replies": [{"target": "{{t1}}", "text": "child", "refId": "r1"}],
+        "quotes": [{"target": "{{r1}}", "text": "grandchild"}],
+    }, fail={'t1'})
+    assert [r['success'] for r in results] == [False, True, False, False]
+    assert results[2]['skipped'] is True and results[3]['skipped'] is True
+    assert [step for step, _ in calls] == [0, 1]
+
+
+def test_exceptions_become_step_errors():
+    async def run_step(step, target):
+        raise RuntimeError('browser gone')
+
+    results = asyncio.run(execute_steps(build_steps({"tweets": [{"text": "x"}]}), run_step))
+    assert results[0]['success'] is False
+    assert 'browser gone' in results[0]['error']
+
+
+def test_cycles_fail_without_running():
+    results, calls = run({
+        "tweets": [{"text": "ok"}],
+        "replies": [
+            {"target": "{{b}}", "text": "a", "refId": "a"},
+            {"target": "{{a}}", "text": "b", "refId": "b"},
+        ],
+    })
+    assert calls == [(0, None)]
+    assert [r['success'] for r in results] == [True, False, False]
+    assert all('Dependency cycle' in r['error'] for r in results[1:])
+
+
+def test_duplicate_ref_ids_are_rejected():
+    with pytest.raises(ValueError, match='Duplicate refId: t'):
+        build_steps({"tweets": [{"text": "a", "refId": "t"}, {"text": "b", "refId": "t"}]})
+
+
+@pytest.mark.parametrize('content', [
+    [],
+    {"tweets": [{"refId": "t"}]},
+    {"replies": [{"text": "no target"}]},
+])
+def test_invalid_content_is_rejected(content):
+    with pytest.raises(ValueError):
+        build_steps(content)
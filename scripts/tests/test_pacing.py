@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+import pacing
+from pacing import Pacer, load_rules, pace
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Freezes pacing's clock; advance it with clock['now'] += seconds."""
+    state = {'now': 1_000_000.0}
+    monkeypatch.setattr(pacing.time, 'time', lambda: state['now'])
+    return state
+
+
+def make_pacer(tmp_path, rules):
+    return Pacer(path=str(tmp_path / 'pacing.sqlite3'), rules=rules)
+
+
+def test_burst_is_free_then_waits_one_interval(tmp_path, clock):
+    pacer = make_pacer(tmp_path, {'post': (3, 10)})
+    assert [pacer.reserve('token', 'post') for _ in range(4)] == [0, 0, 0, 10]
+
+
+def test_queued_reservations_wait_in_order(tmp_path, clock):
+    pacer = make_pacer(tmp_path, {'*': (1, 5)})
+    assert [pacer.reserve('token', 'post') for _ in range(4)] == [0, 5, 10, 15]
+
+
+def test_tokens_refill_over_time(tmp_path, clock):
+    pacer = make_pacer(tmp_path, {'*': (1, 5)})
+    assert pacer.reserve('token', 'post') == 0
+    clock['now'] += 5
+    assert pacer.reserve('token', 'post') == 0
+    clock['now'] += 2
+    assert pacer.reserve('token', 'post') == pytest.approx(3)
+
+
+def test_slowest_bucket_decides(tmp_path, clock):
+    pacer = make_pacer(tmp_path, {'*': (1, 5), 'post': (1, 30)})
+    assert pacer.reserve('token', 'post') == 0
+    assert pacer.reserve('token', 'post') == 30
+    # Other actions only share the account-wide bucket
+    assert pacer.reserve('token', 'reply') == 10
+
+
+def test_accounts_are_paced_separately(tmp_path, clock):
+    pacer = make_pacer(tmp_path, {'*': (1, 5)})
+    assert pacer.reserve('first', 'post') == 0
+    assert pacer.reserve('second', 'post') == 0
+    assert pacer.reserve('first', 'post') == 5
+
+
+def test_pacers_on_one_store_share_buckets(tmp_path, clock):
+    # Separate processes open their own Pacer on the same file
+    first = make_pacer(tmp_path, {'*': (1, 5)})
+    second = make_pacer(tmp_path, {'*': (1, 5)})
+    assert first.reserve('token', 'post') == 0
+    assert second.reserve('token', 'post') == 5
+    assert first.reserve('token', 'post') == 10
+
+
+def test_overrides_replace_defaults(monkeypatch):
+    monkeypatch.setenv('XACTIONS_PACING', '{"post": [2, 60], "*": [1, 0]}')
+    rules = load_rules()
+    assert rules['post'] == (2, 60)
+    assert rules['reply'] == pacing.PACING_RULES['reply']
+    # An interval of 0 removes the bucket
+    assert '*' not in rules
+
+
+@pytest.mark.parametrize('override', ['{"post": [0, 5]}', '{"post": [1]}', '{"post": "fast"}', '[1, 5]'])
+def test_invalid_overrides_raise(monkeypatch, override):
+    monkeypatch.setenv('XACTIONS_PACING', override)
+    with pytest.raises(ValueError):
+        load_rules()
+
+
+def test_off_disables_pacing(tmp_path, monkeypatch, clock):
+    monkeypatch.setenv('XACTIONS_PACING', 'off')
+    monkeypatch.setattr(pacing, 'DEFAULT_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(pacing, '_pacer', None)
+    assert load_rules() == {}
+    assert [asyncio.run(pace('token', 'post')) for _ in range(3)] == [0, 0, 0]
+
+
+def test_pace_reports_the_wait_in_ms(tmp_path, monkeypatch, clock):
+    monkeypatch.setattr(pacing, '_pacer', make_pacer(tmp_path, {'*': (1, 5)}))
+    sleep = asyncio.sleep
+    monkeypatch.setattr(pacing.asyncio, 'sleep', lambda seconds: sleep(0))
+    assert asyncio.run(pace('token', 'post')) == 0
+    assert asyncio.run(pace('token', 'post')) == 5000
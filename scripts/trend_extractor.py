@@ -1,96 +1,464 @@
 import asyncio
-import nodriver as uc
 import argparse
+import gzip
+import http.client
 import json
+import queue
 import sys
 import os
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'twitter_actions'))
+from cache import TTLCache
+from timings import start_timings, phase, with_timings, export_timings, write_timings, add_timing_arguments
 
 # Fix encoding for Windows command line output
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
 
-async def extract_trends(action, country=None):
+# The offline benchmarks point this at a local stand-in
+TRENDS_BASE_URL = (os.environ.get('XACTIONS_TRENDS_BASE_URL') or 'https://getdaytrends.com').rstrip('/')
+
+# The countries list almost never changes; trends refresh roughly hourly upstream.
+CACHE_TTL = {
+    'countries': 24 * 3600,
+    'trends': 10 * 60,
+}
+
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                  '(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml',
+    'Accept-Encoding': 'gzip',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Connection': 'keep-alive',
+}
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+
+class _Node:
+    def __init__(self, tag, attrs, parent=None):
+        self.tag = tag
+        self.attrs = dict(attrs)
+        self.parent = parent
+        self.children = []
+
+    @property
+    def classes(self):
+        return set((self.attrs.get('class') or '').split())
+
+    def text(self):
+        parts = []
+        for child in self.children:
+            parts.append(child if isinstance(child, str) else child.text())
+        return ''.join(parts)
+
+    def find_all(self, predicate):
+        for child in self.children:
+            if isinstance(child, _Node):
+                if predicate(child):
+                    yield child
+                yield from child.find_all(predicate)
+
+    def find(self, predicate):
+        return next(self.find_all(predicate), None)
+
+
+class _TreeBuilder(HTMLParser):
+    """Builds a minimal element tree; enough for the getdaytrends markup."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Node('#document', [])
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        node = _Node(tag, attrs, self.current)
+        self.current.children.append(node)
+        if tag not in VOID_TAGS:
+            self.current = node
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(_Node(tag, attrs, self.current))
+
+    def handle_endtag(self, tag):
+        node = self.current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+
+def parse_html(html):
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+def country_entries(links):
+    """Turns (name, href) pairs into [{"name", "slug"}], skipping external links."""
+    countries_list = []
+    for name, href in links:
+        if href and href.startswith('/'):
+            # extract country slug from href, e.g. /saudi-arabia/
+            slug = href.strip('/').split('/')[-1]
+            countries_list.append({"name": name.strip(), "slug": slug})
+    return countries_list
+
+
+def trend_entries(rows):
+    """Turns (rank, name, volume) rows into [{"rank", "name", "volume"}], skipping rows without a name."""
+    return [
+        {"rank": rank.strip(), "name": name.strip(), "volume": volume.strip()}
+        for rank, name, volume in rows
+        if name.strip()
+    ]
+
+
+def parse_countries(html):
+    """Extracts [{"name", "slug"}] from the `#dropdown-areas a` links."""
+    root = parse_html(html)
+    container = root.find(lambda n: n.attrs.get('id') == 'dropdown-areas') \
+        or root.find(lambda n: n.attrs.get('id') == 'dropdown-countries')
+    if not container:
+        return []
+
+    return country_entries(
+        (area.text(), area.attrs.get('href') or '')
+        for area in container.find_all(lambda n: n.tag == 'a')
+    )
+
+
+def _in_table_body(row):
+    """Matches the `table.table tbody tr` selector."""
+    node = row.parent
+    while node and node.tag != 'tbody':
+        node = node.parent
+    while node and not (node.tag == 'table' and 'table' in node.classes):
+        node = node.parent
+    return node is not None
+
+
+def parse_trends(html, limit=None):
+    """Extracts [{"rank", "name", "volume"}] from the first `limit` `table.table tbody tr` rows."""
+    root = parse_html(html)
+    rows = [row for row in root.find_all(lambda n: n.tag == 'tr') if _in_table_body(row)]
+
+    def cell(row, predicate):
+        el = row.find(predicate)
+        return el.text() if el else ''
+
+    return trend_entries(
+        (
+            cell(row, lambda n: n.tag == 'th'),
+            cell(row, lambda n: n.tag == 'a' and 'string' in n.classes),
+            cell(row, lambda n: n.tag == 'div' and {'small', 'text-muted'} <= n.classes),
+        )
+        for row in rows[:limit]
+    )
+
+
+# How a keep-alive connection the server has already closed fails before a
+# response arrives (RemoteDisconnected is a ConnectionResetError)
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class HTTPPool:
+    """Keeps idle keep-alive HTTP(S) connections to one origin for reuse."""
+
+    def __init__(self, base_url, timeout=10):
+        parts = urlsplit(base_url)
+        self.origin = f'{parts.scheme}://{parts.netloc}'
+        self.host = parts.netloc
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+
+    def get(self, path, redirects=3):
+        try:
+            conn = self._idle.get_nowait()
+            reused = True
+        except queue.Empty:
+            conn = self.connection_class(self.host, timeout=self.timeout)
+            reused = False
+
+        try:
+            try:
+                conn.request('GET', path, headers=HTTP_HEADERS)
+                response = conn.getresponse()
+            except STALE_CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                # The server closed the idle connection in the meantime; that
+                # says nothing about the server, so try once on a fresh one
+                conn.close()
+                conn = self.connection_class(self.host, timeout=self.timeout)
+                conn.request('GET', path, headers=HTTP_HEADERS)
+                response = conn.getresponse()
+            body = response.read()
+        except Exception:
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+        if response.status in (301, 302, 303, 307, 308) and redirects > 0:
+            location = response.getheader('Location') or ''
+            if location.startswith(self.origin):
+                location = location[len(self.origin):]
+            if location.startswith('/'):
+                return self.get(location, redirects - 1)
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status} for {path}")
+
+        if response.getheader('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return body.decode('utf-8', errors='replace')
+
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+
+
+http_pool = HTTPPool(TRENDS_BASE_URL)
+
+
+def page_path(action, country=None):
+    if action == 'trends' and country and country != 'worldwide':
+        return f'/{country}/'
+    return '/'
+
+
+def fetch_http(action, country=None):
+    """Fast path: plain HTTP + HTML parsing. Returns the extracted list (may be empty)."""
+    html = http_pool.get(page_path(action, country))
+    if action == 'countries':
+        return parse_countries(html)
+    return parse_trends(html)
+
+
+class BrowserFallback:
+    """
+    Renders pages in headless Chrome for when plain HTTP is blocked. One
+    browser is started on first use and shared; each page gets its own tab.
+    With block_resources, every tab shares one RequestBlocker.
+    """
+
+    def __init__(self, block_resources=False):
+        self.browser = None
+        self.blocker = None
+        if block_resources:
+            from blocking import RequestBlocker
+            self.blocker = RequestBlocker.from_profile('trends')
+        self._lock = asyncio.Lock()
+
+    async def fetch(self, action, country=None):
+        import nodriver as uc
+
+        async with self._lock:
+            if not self.browser:
+                # User explicitly requested Headless mode
+                self.browser = await uc.start(headless=True)
+
+        url = f'{TRENDS_BASE_URL}{page_path(action, country)}'
+        if self.blocker:
+            page = await self.browser.get('about:blank', new_tab=True)
+            await self.blocker.attach(page)
+            await page.get(url)
+        else:
+            page = await self.browser.get(url, new_tab=True)
+        try:
+            return await extract_from_page(page, action)
+        finally:
+            try:
+                await page.close()
+            except Exception:
+                pass
+
+    def stop(self):
+        if self.browser:
+            self.browser.stop()
+            self.browser = None
+
+
+# Reads every row (or country link) in a single Runtime.evaluate and returns
+# plain arrays, instead of several query_selector round trips per row.
+_EXTRACT_SCRIPT = r"""
+(() => {
+    const text = (el) => el ? el.textContent : '';
+    if (%(countries)s) {
+        let areas = document.querySelectorAll('#dropdown-areas a');
+        if (!areas.length) areas = document.querySelectorAll('#dropdown-countries a');
+        return Array.from(areas, (a) => [text(a), a.getAttribute('href') || '']);
+    }
+    return Array.from(document.querySelectorAll('table.table tbody tr'), (row) => [
+        text(row.querySelector('th')),
+        text(row.querySelector('a.string')),
+        text(row.querySelector('div.small.text-muted'))
+    ]);
+})()
+"""
+
+
+async def extract_from_page(page, action):
+    """Extracts the countries list or every trend row from a rendered getdaytrends page."""
+    from waits import wait_for_selector, evaluate_value
+
+    # Wait for page rendering
+    await wait_for_selector(page, 'table.table tbody tr, #dropdown-areas a', timeout=8)
+
+    rows = await evaluate_value(page, _EXTRACT_SCRIPT % {
+        "countries": 'true' if action == 'countries' else 'false'
+    }) or []
+
+    if action == 'countries':
+        return country_entries(rows)
+    return trend_entries(rows)
+
+
+def open_cache():
     try:
-        # User explicitly requested Headless mode
-        browser = await uc.start(headless=True)
+        return TTLCache('trends')
     except Exception as e:
-        print(json.dumps({"success": False, "error": f"Failed to start browser: {str(e)}"}))
-        return
+        print(f"Trends cache unavailable: {str(e)}", file=sys.stderr)
+        return None
+
+
+def build_result(action, country, data, limit=20):
+    if action == 'countries':
+        countries_list = list(data)
+        # Add Worldwide as default option
+        if not any(c.get('slug') == 'worldwide' for c in countries_list):
+             countries_list.insert(0, {"name": "Worldwide", "slug": "worldwide"})
+        return {"success": True, "countries": countries_list}
+
+    return {
+        "success": True,
+        "country": country if country else "worldwide",
+        "trends": data[:limit]
+    }
+
+
+async def extract_trends(action, country=None, cache=None, use_cached=True, max_age=None, fallback=None, limit=20,
+                         block_resources=False):
+    """
+    Returns the countries list or a country's top `limit` trends, trying the
+    on-disk cache, then plain HTTP, then headless Chrome. Pass a shared
+    BrowserFallback when extracting several pages so at most one browser is started.
+    """
+    key = 'countries' if action == 'countries' else f"trends:{country or 'worldwide'}"
+    start_timings()
+
+    if cache and use_cached:
+        try:
+            hit = cache.get(key, max_age)
+        except Exception:
+            hit = None
+        phase('cacheLookup')
+        if hit:
+            return with_timings({**build_result(action, country, hit[0], limit), "cached": True})
 
     try:
-        url = 'https://getdaytrends.com/'
-        if action == 'trends' and country and country != 'worldwide':
-            url = f'https://getdaytrends.com/{country}/'
-
-        page = await browser.get(url)
-        await asyncio.sleep(4) # Wait for page rendering
-
-        result_data = {}
-
-        if action == 'countries':
-            areas = await page.select_all('#dropdown-areas a')
-            if not areas:
-                areas = await page.select_all('#dropdown-countries a')
-            
-            countries_list = []
-            for area in areas:
-                try:
-                    name = area.text.strip()
-                    href = getattr(area, 'href', '')
-                    if href and href.startswith('/'):
-                        # extract country slug from href, e.g. /saudi-arabia/
-                        slug = href.strip('/').split('/')[-1]
-                        countries_list.append({
-                            "name": name,
-                            "slug": slug
-                        })
-                except: pass
-
-            # Add Worldwide as default option
-            if not any(c.get('slug') == 'worldwide' for c in countries_list):
-                 countries_list.insert(0, {"name": "Worldwide", "slug": "worldwide"})
-
-            result_data = {
-                "success": True,
-                "countries": countries_list
-            }
-
-        elif action == 'trends':
-            trends_list = []
-            rows = await page.select_all('table.table tbody tr')
-            # Limit to top 20 as requested
-            for row in rows[:20]:
+        data = await asyncio.to_thread(fetch_http, action, country)
+    except Exception as e:
+        print(f"HTTP fetch failed, falling back to browser: {str(e)}", file=sys.stderr)
+        data = None
+    phase('http')
+
+    network = None
+    if not data:
+        owns_fallback = fallback is None
+        fallback = fallback or BrowserFallback(block_resources)
+        try:
+            data = await fallback.fetch(action, country)
+            network = fallback.blocker.stats() if fallback.blocker else None
+        except Exception as e:
+            return with_timings({"success": False, "error": str(e)})
+        finally:
+            if owns_fallback:
+                fallback.stop()
+            phase('browser')
+
+    if cache and data:
+        try:
+            cache.set(key, data, CACHE_TTL[action])
+        except Exception:
+            pass
+
+    result = {**build_result(action, country, data, limit), "cached": False}
+    if network:
+        result["network"] = network
+    return with_timings(result)
+
+
+async def extract_many(countries, concurrency=8, all_countries=False, **options):
+    """
+    Extracts trends for several countries concurrently and returns one document
+    keyed by country slug; a failing country only fails its own entry.
+    """
+    timings = start_timings()
+    fallback = BrowserFallback(options.get('block_resources', False))
+    try:
+        if all_countries:
+            listing = await extract_trends('countries', fallback=fallback, **options)
+            if not listing.get('success'):
+                return {"success": False, "error": f"Failed to list countries: {listing.get('error')}"}
+            countries = [c['slug'] for c in listing['countries']]
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(country):
+            async with semaphore:
                 try:
-                    rank_el = await row.query_selector('th')
-                    name_el = await row.query_selector('a.string')
-                    tweets_el = await row.query_selector('div.small.text-muted')
-
-                    if name_el:
-                        trends_list.append({
-                            "rank": rank_el.text.strip() if rank_el else "",
-                            "name": name_el.text.strip(),
-                            "volume": tweets_el.text.strip() if tweets_el else ""
-                        })
-                except:
-                    continue
-            
-            result_data = {
-                "success": True,
-                "country": country if country else "worldwide",
-                "trends": trends_list
-            }
-
-        print(json.dumps(result_data, ensure_ascii=False))
+                    result = await extract_trends('trends', country, fallback=fallback, **options)
+                except Exception as e:
+                    result = {"success": False, "error": str(e)}
+            result.pop('country', None)
+            return country, result
 
-    except Exception as e:
-        print(json.dumps({"success": False, "error": str(e)}, ensure_ascii=False))
+        results = dict(await asyncio.gather(*(run(c) for c in dict.fromkeys(countries))))
     finally:
-        browser.stop()
+        fallback.stop()
+
+    return {
+        "success": any(r.get('success') for r in results.values()),
+        "results": results,
+        "failed": [c for c, r in results.items() if not r.get('success')],
+        "timings": timings.as_dict()
+    }
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--action', choices=['countries', 'trends'], required=True, help='What to extract')
-    parser.add_argument('--country', required=False, help='Country slug for trends')
+    parser.add_argument('--country', required=False, help='Country slug for trends, or a comma-separated list of slugs')
+    parser.add_argument('--all', action='store_true', help='Extract trends for every country in the countries list')
+    parser.add_argument('--concurrency', type=int, default=8, help='Countries fetched at the same time')
+    parser.add_argument('--limit', type=int, default=20, help='Max trends returned per country')
+    parser.add_argument('--max-age', type=float, help='Accept cached results up to this many seconds old')
+    parser.add_argument('--no-cache', action='store_true', help='Always fetch live (the result is still cached)')
+    parser.add_argument('--block-resources', action='store_true', help='Skip images, fonts, styles and analytics in the browser fallback')
+    add_timing_arguments(parser)
     args = parser.parse_args()
+    if args.timings_file:
+        export_timings(args.timings_file, args.timings_format)
+
+    options = dict(cache=open_cache(), use_cached=not args.no_cache, max_age=args.max_age, limit=args.limit,
+                   block_resources=args.block_resources)
+    countries = [c.strip() for c in (args.country or '').split(',') if c.strip()]
 
-    asyncio.run(extract_trends(args.action, args.country))
+    if args.action == 'trends' and (args.all or len(countries) > 1):
+        result = asyncio.run(extract_many(countries, args.concurrency, all_countries=args.all, **options))
+    else:
+        result = asyncio.run(extract_trends(args.action, countries[0] if countries else None, **options))
+    print(json.dumps(result, ensure_ascii=False))
+    write_timings(result)
@@ -0,0 +1,138 @@
+"""
+Opt-in request blocking for automation sessions.
+
+The scripts only need the DOM, so images, video, fonts and analytics beacons
+are dead weight. A RequestBlocker pauses only the matching requests through
+CDP Fetch interception and fails them; everything else is never paused.
+Counters are kept per blocker so callers can report what was skipped.
+
+A blocked request never reaches the server, so its size is unknown. The
+saving is estimated from typical response sizes per resource type
+(ESTIMATED_BYTES); transferredBytes is the exact amount that was downloaded.
+"""
+import fnmatch
+import nodriver as uc
+
+# Per-script profiles: CDP resource types and URL glob patterns to block.
+BLOCK_PROFILES = {
+    'actions': {
+        'resource_types': ['Image', 'Media', 'Font'],
+        'url_patterns': [
+            '*://*.google-analytics.com/*',
+            '*://*.googletagmanager.com/*',
+            '*://*.doubleclick.net/*',
+            '*://ads-api.x.com/*',
+            '*://x.com/i/api/1.1/jot/*',
+            '*://api.x.com/1.1/jot/*',
+        ],
+    },
+    'check_suspension': {
+        'resource_types': ['Image', 'Media', 'Font'],
+        'url_patterns': [
+            '*://*.google-analytics.com/*',
+            '*://*.googletagmanager.com/*',
+            '*://*.doubleclick.net/*',
+            '*://x.com/i/api/1.1/jot/*',
+            '*://api.x.com/1.1/jot/*',
+        ],
+    },
+    'trends': {
+        'resource_types': ['Image', 'Media', 'Font', 'Stylesheet'],
+        'url_patterns': [
+            '*://*.google-analytics.com/*',
+            '*://*.googletagmanager.com/*',
+            '*://*.googlesyndication.com/*',
+            '*://*.doubleclick.net/*',
+        ],
+    },
+}
+
+# Never blocked, whatever the profile says: media uploads from the composer
+# and in-page object URLs used for attachment previews.
+ALWAYS_ALLOW = [
+    'blob:*',
+    'data:*',
+    '*://upload.x.com/*',
+    '*://upload.twitter.com/*',
+]
+
+
+# Rough transfer size of one response by CDP resource type, for estimating
+# what blocking saved. X serves resized images and streams video in segments.
+ESTIMATED_BYTES = {
+    'Image': 25_000,
+    'Media': 250_000,
+    'Font': 40_000,
+    'Stylesheet': 15_000,
+    'Script': 30_000,
+}
+# Beacons, pings and other small requests matched by URL
+DEFAULT_ESTIMATED_BYTES = 1_000
+
+
+class RequestBlocker:
+    def __init__(self, resource_types=(), url_patterns=()):
+        self.resource_types = list(resource_types)
+        self.url_patterns = list(url_patterns)
+        self.blocked_requests = 0
+        self.blocked_by_type = {}
+        self.transferred_bytes = 0
+        self.estimated_saved_bytes = 0
+
+    @classmethod
+    def from_profile(cls, name):
+        profile = BLOCK_PROFILES[name]
+        return cls(profile['resource_types'], profile['url_patterns'])
+
+    async def attach(self, page):
+        """Starts blocking on `page`. Can be attached to several pages; counters are shared."""
+        page.add_handler(uc.cdp.fetch.RequestPaused, self._on_paused)
+        page.add_handler(uc.cdp.network.LoadingFinished, self._on_finished)
+
+        patterns = [
+            uc.cdp.fetch.RequestPattern(
+                url_pattern='*',
+                resource_type=uc.cdp.network.ResourceType(resource_type),
+                request_stage=uc.cdp.fetch.RequestStage.REQUEST
+            )
+            for resource_type in self.resource_types
+        ] + [
+            uc.cdp.fetch.RequestPattern(url_pattern=pattern, request_stage=uc.cdp.fetch.RequestStage.REQUEST)
+            for pattern in self.url_patterns
+        ]
+
+        await page.send(uc.cdp.network.enable())
+        if patterns:
+            await page.send(uc.cdp.fetch.enable(patterns=patterns))
+
+    async def _on_paused(self, event, page):
+        url = event.request.url
+        if any(fnmatch.fnmatch(url, pattern) for pattern in ALWAYS_ALLOW):
+            await page.send(uc.cdp.fetch.continue_request(request_id=event.request_id))
+            return
+
+        resource_type = event.resource_type.value if event.resource_type else 'Other'
+        self.blocked_requests += 1
+        self.blocked_by_type[resource_type] = self.blocked_by_type.get(resource_type, 0) + 1
+        self.estimated_saved_bytes += ESTIMATED_BYTES.get(resource_type, DEFAULT_ESTIMATED_BYTES)
+        await page.send(uc.cdp.fetch.fail_request(
+            request_id=event.request_id,
+            error_reason=uc.cdp.network.ErrorReason.BLOCKED_BY_CLIENT
+        ))
+
+    def _on_finished(self, event):
+        self.transferred_bytes += int(event.encoded_data_length or 0)
+
+    def stats(self):
+        """
+        Counters for the JSON output. transferredBytes is what was actually
+        downloaded; estimatedSavedBytes is the estimate for what was blocked
+        (see ESTIMATED_BYTES). Comparing transferredBytes with a run without
+        blocking gives the exact saving.
+        """
+        return {
+            "blockedRequests": self.blocked_requests,
+            "blockedByType": dict(self.blocked_by_type),
+            "transferredBytes": self.transferred_bytes,
+            "estimatedSavedBytes": self.estimated_saved_bytes,
+        }
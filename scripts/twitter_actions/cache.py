@@ -0,0 +1,75 @@
+"""
+Small on-disk TTL cache shared by the scripts, backed by SQLite.
+
+SQLite does the file locking, so several script instances can read and write
+the same cache at once. Values are stored as JSON.
+"""
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+DEFAULT_CACHE_DIR = os.environ.get('XACTIONS_CACHE_DIR') or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache'
+)
+
+
+class TTLCache:
+    def __init__(self, name, path=None):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, f'{name}.sqlite3')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                ' key TEXT PRIMARY KEY,'
+                ' value TEXT NOT NULL,'
+                ' stored_at REAL NOT NULL,'
+                ' expires_at REAL NOT NULL)'
+            )
+
+    @contextmanager
+    def _connect(self):
+        # Waits on locks held by other processes instead of failing right away
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key, max_age=None):
+        """
+        Returns (value, stored_at) for a live entry, or None.
+        `max_age` (seconds) replaces the TTL the entry was stored with.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT value, stored_at, expires_at FROM entries WHERE key = ?', (key,)
+            ).fetchone()
+
+        if not row:
+            return None
+        value, stored_at, expires_at = row
+        now = time.time()
+        fresh = (now - stored_at) <= max_age if max_age is not None else now < expires_at
+        if not fresh:
+            return None
+        return json.loads(value), stored_at
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO entries (key, value, stored_at, expires_at) VALUES (?, ?, ?, ?)'
+                ' ON CONFLICT(key) DO UPDATE SET value = excluded.value,'
+                ' stored_at = excluded.stored_at, expires_at = excluded.expires_at',
+                (key, json.dumps(value, ensure_ascii=False), now, now + ttl)
+            )
+        return now
+
+    def purge(self):
+        """Deletes expired entries."""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM entries WHERE expires_at <= ?', (time.time(),))
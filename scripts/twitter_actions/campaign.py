@@ -0,0 +1,234 @@
+"""
+Runs a whole campaign for one account in a single browser session.
+
+Takes the campaign content the dashboard stores, e.g.
+
+    {
+        "tweets":  [{"text": "Thread start", "refId": "t1"}],
+        "replies": [{"target": "{{t1}}", "text": "Part two", "refId": "r1"}],
+        "quotes":  [{"target": "{{r1}}", "text": "Worth a read"}]
+    }
+
+A `{{refId}}` in a target refers to the tweet, reply or quote created by the
+step with that refId, which makes the campaign a dependency graph. Steps run
+as soon as everything they reference exists and IDs are resolved in-process.
+Steps that depend on a failed step are skipped. All steps share one
+authenticated session, so Chrome starts and logs in once per campaign.
+
+Prints {"success": true, "results": [...]} with one entry per step, in the
+order the steps appear in the campaign.
+
+Usage:
+    python campaign.py --token TOKEN --campaign campaign.json
+    python campaign.py --token TOKEN --campaign - < campaign.json
+"""
+import asyncio
+import argparse
+import json
+import re
+import sys
+from utils import success_response, error_response, print_result, start_timings, phase, export_timings, add_timing_arguments, x_url
+from session_pool import SessionPool, open_session
+from display import add_run_mode_argument
+from nodriver_post import post_tweet
+from nodriver_reply import reply_tweet
+from nodriver_quote import quote_tweet
+
+REF_PATTERN = re.compile(r'\{\{(.*?)\}\}')
+
+# Campaign content key -> step type
+STEP_SOURCES = (('tweets', 'tweet'), ('replies', 'reply'), ('quotes', 'quote'))
+
+# Result field holding the ID of the created tweet, per step type
+ID_FIELDS = {'tweet': 'tweetId', 'reply': 'replyId', 'quote': 'quoteId'}
+
+STEP_ACTIONS = {
+    'tweet': lambda token, step, target, pool: post_tweet(
+        token, step['text'], step.get('media'), pool=pool, human_typing=step.get('humanTyping', False)),
+    'reply': lambda token, step, target, pool: reply_tweet(
+        token, target, step['text'], step.get('media'), pool=pool, human_typing=step.get('humanTyping', False)),
+    'quote': lambda token, step, target, pool: quote_tweet(
+        token, target, step['text'], step.get('media'), pool=pool, human_typing=step.get('humanTyping', False)),
+}
+
+
+def build_steps(content):
+    """
+    Flattens campaign content into a list of steps, each with the refIds it
+    depends on. Raises ValueError for content that cannot be run.
+    """
+    if not isinstance(content, dict):
+        raise ValueError("Campaign must be a JSON object.")
+
+    steps = []
+    for key, step_type in STEP_SOURCES:
+        for item in content.get(key) or []:
+            if not isinstance(item, dict) or not item.get('text'):
+                raise ValueError(f"Every entry in {key} needs a text.")
+            if step_type != 'tweet' and not item.get('target'):
+                raise ValueError(f"Every entry in {key} needs a target.")
+
+            ref_id = (item.get('refId') or '').strip() or None
+            target = item.get('target')
+            steps.append({
+                **item,
+                "step": len(steps),
+                "type": step_type,
+                "refId": ref_id,
+                "dependsOn": [ref.strip() for ref in REF_PATTERN.findall(target or '')],
+            })
+
+    ref_ids = [step['refId'] for step in steps if step['refId']]
+    duplicates = sorted({ref for ref in ref_ids if ref_ids.count(ref) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate refId: {', '.join(duplicates)}")
+
+    return steps
+
+
+def resolve_target(target, ids):
+    """Replaces {{refId}} placeholders with created IDs and returns a tweet URL."""
+    resolved = REF_PATTERN.sub(lambda m: ids[m.group(1).strip()], target)
+    return resolved if resolved.startswith('http') else x_url(f'/i/status/{resolved}')
+
+
+async def execute_steps(steps, run_step):
+    """
+    Runs `steps` in dependency order. `run_step(step, target)` performs one
+    step and returns its response dict. Of the steps whose dependencies are
+    done, the earliest in the campaign goes first. Returns the results in
+    campaign order.
+    """
+    known = {step['refId'] for step in steps if step['refId']}
+    ids = {}
+    failed = set()
+    results = [None] * len(steps)
+    pending = list(steps)
+
+    def finish(step, result):
+        results[step['step']] = {"step": step['step'], "type": step['type'], "refId": step['refId'], **result}
+        pending.remove(step)
+        if step['refId']:
+            created = result.get(ID_FIELDS[step['type']]) if result.get('success') else None
+            if created:
+                ids[step['refId']] = created
+            else:
+                failed.add(step['refId'])
+
+    while pending:
+        progressed = False
+        for step in list(pending):
+            unknown = [ref for ref in step['dependsOn'] if ref not in known]
+            blocked = [ref for ref in step['dependsOn'] if ref in failed]
+            if unknown:
+                finish(step, error_response(f"Unknown refId: {', '.join(unknown)}"))
+            elif blocked:
+                finish(step, {**error_response(f"Skipped: {', '.join(blocked)} has no created tweet ID"), "skipped": True})
+            elif all(ref in ids for ref in step['dependsOn']):
+                target = resolve_target(step['target'], ids) if step.get('target') else None
+                try:
+                    result = await run_step(step, target)
+                except Exception as e:
+                    result = error_response(f"Error during {step['type']}: {str(e)}")
+                finish(step, {"target": target, **result} if target else result)
+            else:
+                continue
+            progressed = True
+            break
+
+        if not progressed:
+            # Only steps waiting on each other are left
+            for step in list(pending):
+                finish(step, error_response(f"Dependency cycle through refId: {', '.join(step['dependsOn'])}"))
+
+    return results
+
+
+async def run_campaign(auth_token, content, pool=None, delay=0, block_resources=False, persistent=False, run_mode=None):
+    """
+    Runs every step of `content` for one account and returns
+    {"success": true, "results": [...]}, or an error response when the
+    campaign is invalid or the browser cannot be started. `delay` adds a
+    pause in seconds between steps.
+    """
+    start_timings()
+    try:
+        steps = build_steps(content)
+    except ValueError as e:
+        return error_response(str(e))
+
+    owns_pool = pool is None
+    if owns_pool:
+        pool = SessionPool(
+            max_sessions=1,
+            block_profile='actions' if block_resources else None,
+            persistent=persistent,
+            run_mode=run_mode
+        )
+
+    try:
+        # Log in once up front so a bad token fails the campaign, not every step
+        try:
+            session = await open_session(auth_token, pool)
+        except Exception as e:
+            return error_response(f"Failed to initialize browser: {str(e)}")
+        await session.release()
+        phase('login')
+
+        started = False
+
+        async def run_step(step, target):
+            nonlocal started
+            if started and delay:
+                await asyncio.sleep(delay)
+            started = True
+            # Own task so each step reports its own timings, not the campaign's
+            return await asyncio.create_task(STEP_ACTIONS[step['type']](auth_token, step, target, pool))
+
+        results = await execute_steps(steps, run_step)
+        phase('steps')
+        return success_response({
+            "results": results,
+            "succeeded": sum(1 for r in results if r.get('success')),
+            "failed": sum(1 for r in results if not r.get('success')),
+            "pacingWaitMs": sum(r.get('pacingWaitMs', 0) for r in results),
+        })
+    finally:
+        if owns_pool:
+            await pool.close()
+
+
+def read_campaign(path):
+    """Loads campaign JSON from a file, or from stdin when path is "-"."""
+    if path == '-':
+        return json.load(sys.stdin)
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--token', required=True, help='Twitter auth_token')
+    parser.add_argument('--campaign', required=True, help='Campaign content JSON file ("-" for stdin)')
+    parser.add_argument('--delay', type=float, default=0, help='Seconds to wait between steps')
+    parser.add_argument('--block-resources', action='store_true', help='Skip images, video, fonts and analytics while acting')
+    parser.add_argument('--persistent-profile', action='store_true', help='Keep a Chrome profile per account so later runs start logged in')
+    add_run_mode_argument(parser)
+    add_timing_arguments(parser)
+    args = parser.parse_args()
+    if args.timings_file:
+        export_timings(args.timings_file, args.timings_format)
+
+    try:
+        content = read_campaign(args.campaign)
+    except (OSError, json.JSONDecodeError) as e:
+        print_result(error_response(f"Could not read campaign: {str(e)}"))
+        sys.exit(1)
+
+    print_result(asyncio.run(run_campaign(
+        args.token, content,
+        delay=args.delay,
+        block_resources=args.block_resources,
+        persistent=args.persistent_profile,
+        run_mode=args.run_mode
+    )))
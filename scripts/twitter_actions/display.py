@@ -0,0 +1,162 @@
+"""
+Run modes for the browsers the action scripts start.
+
+- "headful" (default): a normal window on the current display.
+- "headless": Chrome's new headless mode with a stealth profile. The
+  "HeadlessChrome" token is removed from the user agent and the window gets a
+  desktop size, which are the usual giveaways.
+- "xvfb": a normal window on a virtual X display, for servers without a
+  screen. Displays come from a DisplayPool: an Xvfb server is shared by up to
+  `browsers_per_display` browsers and kept running until the process exits,
+  so sessions reuse displays instead of starting one each.
+
+The default mode can be set with XACTIONS_RUN_MODE.
+"""
+import asyncio
+import atexit
+import os
+import subprocess
+import nodriver as uc
+
+RUN_MODES = ('headful', 'headless', 'xvfb')
+DEFAULT_RUN_MODE = os.environ.get('XACTIONS_RUN_MODE') or 'headful'
+
+WINDOW_SIZE = '1920,1080'
+XVFB_SCREEN = '1920x1080x24'
+BROWSERS_PER_DISPLAY = int(os.environ.get('XACTIONS_BROWSERS_PER_DISPLAY') or 8)
+
+
+class VirtualDisplay:
+    """One Xvfb server and the browsers drawing on it."""
+
+    def __init__(self, number, process):
+        self.number = number
+        self.process = process
+        self.browsers = []
+        # Browsers handed this display that are still starting
+        self.starting = 0
+
+    @property
+    def name(self):
+        return f':{self.number}'
+
+    @property
+    def load(self):
+        self.browsers = [b for b in self.browsers if not b.stopped]
+        return len(self.browsers) + self.starting
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class DisplayPool:
+    """
+    Hands out Xvfb displays. A browser goes to the least loaded display with
+    room left; a new Xvfb server is started only when all are full.
+    """
+
+    def __init__(self, browsers_per_display=BROWSERS_PER_DISPLAY, screen=XVFB_SCREEN):
+        self.browsers_per_display = max(1, browsers_per_display)
+        self.screen = screen
+        self.displays = []
+        self._lock = asyncio.Lock()
+        atexit.register(self.close)
+
+    async def acquire(self):
+        async with self._lock:
+            self.displays = [d for d in self.displays if d.process.poll() is None]
+            available = [d for d in self.displays if d.load < self.browsers_per_display]
+            if available:
+                display = min(available, key=lambda d: d.load)
+            else:
+                display = await self._start_display()
+                self.displays.append(display)
+            display.starting += 1
+            return display
+
+    async def _start_display(self):
+        # -displayfd lets Xvfb pick a free display number and report it, so
+        # several processes can share a machine without colliding
+        try:
+            process = subprocess.Popen(
+                ['Xvfb', '-displayfd', '1', '-screen', '0', self.screen, '-nolisten', 'tcp'],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+        except FileNotFoundError:
+            raise RuntimeError("Run mode 'xvfb' needs Xvfb installed (e.g. apt install xvfb).")
+
+        try:
+            line = await asyncio.wait_for(asyncio.to_thread(process.stdout.readline), timeout=10)
+            number = int(line)
+        except (asyncio.TimeoutError, ValueError):
+            process.kill()
+            raise RuntimeError("Xvfb did not start.")
+        return VirtualDisplay(number, process)
+
+    def close(self):
+        """Stops every Xvfb server of this pool."""
+        for display in self.displays:
+            display.stop()
+        self.displays = []
+
+
+_display_pool = None
+
+
+def display_pool():
+    """The process-wide DisplayPool, created on first use."""
+    global _display_pool
+    if _display_pool is None:
+        _display_pool = DisplayPool()
+    return _display_pool
+
+
+async def start_browser(run_mode=None, user_data_dir=None):
+    """Starts Chrome in `run_mode` (default DEFAULT_RUN_MODE) and returns the nodriver browser."""
+    run_mode = run_mode or DEFAULT_RUN_MODE
+    if run_mode not in RUN_MODES:
+        raise ValueError(f"Unknown run mode {run_mode!r}, expected one of {', '.join(RUN_MODES)}.")
+
+    if run_mode == 'xvfb':
+        display = await display_pool().acquire()
+        try:
+            browser = await uc.start(headless=False, user_data_dir=user_data_dir,
+                                     browser_args=[f'--display={display.name}'])
+            display.browsers.append(browser)
+        finally:
+            display.starting -= 1
+        return browser
+
+    if run_mode == 'headless':
+        browser = await uc.start(headless=True, user_data_dir=user_data_dir,
+                                 browser_args=[f'--window-size={WINDOW_SIZE}'])
+        try:
+            await apply_stealth(browser)
+        except Exception:
+            browser.stop()
+            raise
+        return browser
+
+    # Interactive mode gets past Cloudflare/bot detection; nodriver handles
+    # stealth itself there, and extra args can break it
+    return await uc.start(headless=False, user_data_dir=user_data_dir)
+
+
+async def apply_stealth(browser, tab=None):
+    """Gives `tab` (default the main tab) of a headless browser the user agent of a regular Chrome."""
+    tab = tab or browser.main_tab
+    version = await tab.send(uc.cdp.browser.get_version())
+    user_agent = version[3].replace('HeadlessChrome', 'Chrome')
+    await tab.send(uc.cdp.emulation.set_user_agent_override(
+        user_agent=user_agent, accept_language='en-US,en'
+    ))
+
+
+def add_run_mode_argument(parser):
+    parser.add_argument('--run-mode', choices=RUN_MODES, default=DEFAULT_RUN_MODE,
+                        help='headful window, stealth headless, or headful on a pooled Xvfb display')
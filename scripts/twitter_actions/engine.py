@@ -0,0 +1,180 @@
+"""
+Runs post/reply/quote jobs for many accounts at the same time.
+
+Reads a batch of jobs, one per account, as a JSON array or one JSON object
+per line:
+
+    {"id": "acc1", "token": "...", "actions": [
+        {"action": "post", "text": "hello"},
+        {"action": "reply", "target": "https://x.com/i/status/1", "text": "hi"}
+    ]}
+    {"id": "acc2", "token": "...", "actions": [{"action": "campaign", "campaign": {...}}]}
+
+Accounts run concurrently; the actions of one account run one after another.
+At most `max_browsers` browsers are alive at once, and no new account is
+started while system memory use is above `memory_ceiling`, unless nothing
+else is running. With --accounts-per-browser N each browser holds up to N
+accounts in separate browser contexts (own cookies, storage and cache), so
+N times as many accounts run in the same number of Chrome processes.
+Each result is printed as one JSON line as soon as it is done:
+{"job": "acc1", "step": 0, "action": "post", "success": true, ...}
+
+Usage (from scripts/):
+    python -m twitter_actions.engine --jobs jobs.json --max-browsers 4
+    python -m twitter_actions.engine --jobs - --memory-ceiling 0.8 < jobs.ndjson
+    python -m twitter_actions.engine --jobs jobs.json --max-browsers 2 --accounts-per-browser 8
+"""
+import asyncio
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils import error_response, export_timings, write_timings, add_timing_arguments
+from session_pool import SessionPool
+from display import add_run_mode_argument
+from worker import Worker
+
+
+def memory_usage():
+    """
+    Fraction of system memory in use, from /proc/meminfo.
+    Returns None where that is not available, which disables the ceiling.
+    """
+    try:
+        with open('/proc/meminfo') as f:
+            info = {line.split(':')[0]: int(line.split()[1]) for line in f if ':' in line}
+        return 1 - info['MemAvailable'] / info['MemTotal']
+    except (OSError, KeyError, ValueError, ZeroDivisionError):
+        return None
+
+
+class Engine:
+    def __init__(self, pool, max_browsers=4, memory_ceiling=None, on_result=None):
+        self.pool = pool
+        self.worker = Worker(concurrency=max_browsers, pool=pool)
+        self.slots = asyncio.Semaphore(max(1, max_browsers))
+        self.memory_ceiling = memory_ceiling
+        self.on_result = on_result or (lambda result: None)
+        self.running = 0
+        self._account_locks = {}
+        self._changed = asyncio.Condition()
+
+    async def run(self, jobs):
+        """Runs every job and returns once all results have been reported."""
+        await asyncio.gather(*(self.run_job(job, index) for index, job in enumerate(jobs)))
+
+    async def run_job(self, job, index):
+        job_id = job.get('id', index) if isinstance(job, dict) else index
+        token = job.get('token') if isinstance(job, dict) else None
+        actions = job.get('actions') if isinstance(job, dict) else None
+        if not token or not isinstance(actions, list):
+            self.on_result({"job": job_id, **error_response("Job needs a token and an actions list.")})
+            return
+
+        # One action at a time per account; waiting here does not hold a browser slot
+        async with self._account_lock(token):
+            async with self.slots:
+                await self._wait_for_memory()
+                self.running += 1
+                try:
+                    for step, action in enumerate(actions):
+                        name = action.get('action') if isinstance(action, dict) else None
+                        if not name:
+                            result = error_response("Action needs an \"action\" field.")
+                        else:
+                            result = await self.worker.dispatch({**action, 'token': token})
+                        self.on_result({"job": job_id, "step": step, "action": name, **result})
+                finally:
+                    self.running -= 1
+                    async with self._changed:
+                        self._changed.notify_all()
+
+    def _account_lock(self, token):
+        if token not in self._account_locks:
+            self._account_locks[token] = asyncio.Lock()
+        return self._account_locks[token]
+
+    async def _wait_for_memory(self):
+        if self.memory_ceiling is None:
+            return
+
+        while self.running:
+            usage = memory_usage()
+            if usage is None or usage < self.memory_ceiling:
+                return
+            # Warm idle browsers are the first thing to give back
+            if await self.pool.stop_idle():
+                continue
+            async with self._changed:
+                await self._changed.wait()
+
+
+def read_jobs(path):
+    """Loads jobs from a JSON array or JSON-lines file, or stdin when path is "-"."""
+    if path == '-':
+        text = sys.stdin.read()
+    else:
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+
+    text = text.strip()
+    if text.startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+async def main(args):
+    # Action scripts print progress messages; keep stdout reserved for results.
+    out = sys.stdout
+    sys.stdout = sys.stderr
+
+    def emit(result):
+        out.write(json.dumps(result) + '\n')
+        out.flush()
+        write_timings(result)
+
+    try:
+        jobs = read_jobs(args.jobs)
+    except (OSError, json.JSONDecodeError) as e:
+        emit(error_response(f"Could not read jobs: {str(e)}"))
+        return
+
+    # Accounts alive at once; with contexts several of them share a browser
+    accounts = args.max_browsers * max(1, args.accounts_per_browser)
+    pool = SessionPool(
+        max_sessions=accounts,
+        idle_ttl=args.idle_ttl,
+        block_profile='actions' if args.block_resources else None,
+        persistent=args.persistent_profiles,
+        run_mode=args.run_mode,
+        accounts_per_browser=args.accounts_per_browser
+    )
+    engine = Engine(pool, max_browsers=accounts, memory_ceiling=args.memory_ceiling, on_result=emit)
+    try:
+        await engine.run(jobs)
+    finally:
+        await pool.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run post/reply/quote jobs for many accounts in parallel')
+    parser.add_argument('--jobs', required=True, help='Jobs as a JSON array or one JSON object per line ("-" for stdin)')
+    parser.add_argument('--max-browsers', type=int, default=4, help='Max browsers alive at the same time')
+    parser.add_argument('--memory-ceiling', type=float, help='Do not start more accounts while this fraction of memory is used (e.g. 0.85)')
+    parser.add_argument('--idle-ttl', type=float, default=300, help='Seconds before an idle browser is closed')
+    parser.add_argument('--block-resources', action='store_true', help='Skip images, video, fonts and analytics in every session')
+    parser.add_argument('--persistent-profiles', action='store_true', help='Keep a Chrome profile per account between runs')
+    parser.add_argument('--accounts-per-browser', type=int, default=1,
+                        help='Accounts per Chrome, each in its own browser context; --max-browsers then allows that many accounts per browser')
+    add_run_mode_argument(parser)
+    add_timing_arguments(parser)
+    args = parser.parse_args()
+    if args.accounts_per_browser > 1 and args.persistent_profiles:
+        parser.error("--persistent-profiles needs a Chrome per account and cannot be combined with --accounts-per-browser")
+    if args.timings_file:
+        export_timings(args.timings_file, args.timings_format)
+
+    asyncio.run(main(args))
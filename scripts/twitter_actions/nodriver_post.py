@@ -1,26 +1,49 @@
 import asyncio
 import sys
 import argparse
-from utils import setup_browser, print_success, print_error
+from utils import success_response, error_response, print_result, start_timings, phase, export_timings, add_timing_arguments, x_url
+from utils import attach_media, insert_text, submit_and_capture
+from session_pool import open_session
+from display import add_run_mode_argument
+from waits import wait_for_selector, wait_for_any_selector, wait_for_navigation
 import nodriver as uc
 
-async def post_tweet(auth_token, text, media=None):
-    browser, page = await setup_browser(auth_token)
-    if not browser or not page:
-        return
+async def post_tweet(auth_token, text, media=None, pool=None, block_resources=False, persistent=False, human_typing=False, run_mode=None):
+    start_timings()
+    try:
+        session = await open_session(
+            auth_token, pool,
+            block_profile='actions' if block_resources else None,
+            persistent=persistent,
+            run_mode=run_mode
+        )
+    except Exception as e:
+        return error_response(f"Failed to initialize browser: {str(e)}")
+    page = session.page
+    phase('session')
+    # Only a session that finished cleanly goes back to the pool; after a
+    # failure the page may hold a half-filled composer or an error page
+    succeeded = False
 
     try:
+        # A warm pooled session may still be on the previous action's page,
+        # whose inline textarea would be a reply box rather than a new tweet.
+        if session.reused:
+            await page.get(x_url('/home'))
+            await wait_for_navigation(page, '/home', timeout=10)
+            phase('homeLoad')
+
         # 1. Open Composer
-        # Try to find existing textarea first
-        textarea = await page.select('[data-testid="tweetTextarea_0"]')
+        # Probe for the inline textarea and the sidebar compose button in one round trip
+        matched, element = await wait_for_any_selector(page, [
+            '[data-testid="tweetTextarea_0"]',
+            '[data-testid="SideNav_NewTweet_Button"]'
+        ], timeout=10)
+        textarea = element if matched == '[data-testid="tweetTextarea_0"]' else None
         
         if not textarea:
             # Click sidebar compose button
-            compose_btn = None
-            try:
-                compose_btn = await page.select('[data-testid="SideNav_NewTweet_Button"]')
-            except:
-                pass
+            compose_btn = element if matched else None
                 
             if compose_btn:
                 await compose_btn.click()
@@ -30,138 +53,65 @@ async def post_tweet(auth_token, text, media=None):
                     type_="char",
                     text="n"
                 ))
-            
-            await asyncio.sleep(2)
-            
+
             # Wait for textarea to appear
-            for _ in range(10):
-                try:
-                    textarea = await page.select('[data-testid="tweetTextarea_0"]')
-                    if textarea:
-                        break
-                except:
-                    pass
-                await asyncio.sleep(0.5)
+            textarea = await wait_for_selector(page, '[data-testid="tweetTextarea_0"]', timeout=7)
 
         if not textarea:
-            print_error("Failed to find tweet composer textarea.")
-            return
+            return error_response("Failed to find tweet composer textarea.")
+        phase('composer')
 
         # 2. Type Text
         await textarea.click()
         await asyncio.sleep(0.3)
-        await textarea.send_keys(text)
-        await asyncio.sleep(1)
+        await insert_text(page, text, human=human_typing)
+        phase('typing')
 
         # 3. Handle Media if present
         if media:
-            try:
-                # Find the file input element. Twitter uses a hidden input[type="file"]
-                file_input = await page.select('input[type="file"][accept*="image"]')
-                if file_input:
-                    await file_input.send_file(media)
-                    # wait a bit for upload to process, Twitter disables post button while uploading
-                    await asyncio.sleep(3)
-                else:
-                    print("Could not find file input for media.")
-            except Exception as me:
-                print(f"Failed to attach media: {str(me)}")
+            media_error = await attach_media(page, media)
+            if media_error:
+                return error_response(media_error)
+            phase('mediaUpload')
 
-        # 4. Click Post Button
-        post_btn = None
-        
-        # Find active post button (could be multiple if modal vs inline)
-        valid_selectors = [
+        # 4. Click Post Button (could be modal or inline) and read the new ID
+        tweet_id, pacing_wait_ms, submit_error = await submit_and_capture(page, auth_token, 'post', text, [
             '[data-testid="tweetButton"]:not([disabled])',
             '[data-testid="tweetButtonInline"]:not([disabled])'
-        ]
-        
-        for _ in range(10): # Poll for up to 5 seconds
-            for selector in valid_selectors:
-                try:
-                    post_btn = await page.select(selector)
-                    if post_btn:
-                        break
-                except:
-                    pass
-            if post_btn:
-                break
-            await asyncio.sleep(0.5)
-
-        if post_btn:
-            await post_btn.click()
-        else:
-            # Fallback: Send Ctrl+Enter via CDP keyboard event
-            print("Post button not found natively, attempting Ctrl+Enter fallback...")
-            # We must dispatch raw CDP events for modifiers
-            await page.send(uc.cdp.input_.dispatch_key_event(
-                type_="rawKeyDown",
-                windows_virtual_key_code=17, # Ctrl
-                modifiers=2 # Ctrl modifier mask
-            ))
-            await page.send(uc.cdp.input_.dispatch_key_event(
-                type_="keyDown",
-                windows_virtual_key_code=13, # Enter
-                modifiers=2 
-            ))
-            await page.send(uc.cdp.input_.dispatch_key_event(
-                type_="keyUp",
-                windows_virtual_key_code=13,
-                modifiers=2
-            ))
-            await page.send(uc.cdp.input_.dispatch_key_event(
-                type_="keyUp",
-                windows_virtual_key_code=17,
-                modifiers=0
-            ))
-
-        # Wait for the post to register and composer to close
-        await asyncio.sleep(4)
-
-        # 4. Verify and get ID
-        # The DOM might keep the textarea around but hidden. 
-        # The surest sign of a failed post is if our text is still in it.
-        try:
-             still_open = await page.select('[data-testid="tweetTextarea_0"]')
-             if still_open:
-                 # Check if the text we typed is still there
-                 val = getattr(still_open, 'value', '')
-                 if text in val:
-                     print_error("Post button clicked, but text remains in composer. Post likely failed.")
-                     return
-        except:
-             # Exception means element not found, which is also good (composer removed)
-             pass
-
-        # Try to get ID from toast notification
-        tweet_id = None
-        try:
-            toast = await page.select('[data-testid="toast"]')
-            if toast:
-                links = await toast.query_selector_all('a[href*="/status/"]')
-                for link in links:
-                    href = getattr(link, 'href', '')
-                    if '/status/' in href:
-                        tweet_id = href.split('/status/')[1].split('/')[0]
-                        break
-        except:
-            pass
+        ])
+        if submit_error:
+            return error_response(submit_error)
 
-        print_success({
+        succeeded = True
+        return success_response({
             "message": "Tweet posted successfully",
-            "tweetId": tweet_id
+            "tweetId": tweet_id,
+            "pacingWaitMs": pacing_wait_ms
         })
 
     except Exception as e:
-        print_error(f"Error during post: {str(e)}")
+        return error_response(f"Error during post: {str(e)}")
     finally:
-        browser.stop()
+        await session.release(discard=not succeeded)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--token', required=True, help='Twitter auth_token')
     parser.add_argument('--text', required=True, help='Text to tweet')
-    parser.add_argument('--media', required=False, help='Path to media file to upload')
+    parser.add_argument('--media', nargs='+', required=False, help='Path(s) of media files to upload (up to 4 images, or one video/GIF)')
+    parser.add_argument('--block-resources', action='store_true', help='Skip images, video, fonts and analytics while acting')
+    parser.add_argument('--persistent-profile', action='store_true', help='Keep a Chrome profile per account so later runs start logged in')
+    parser.add_argument('--human-typing', action='store_true', help='Type word by word with short pauses instead of inserting the text at once')
+    add_run_mode_argument(parser)
+    add_timing_arguments(parser)
     args = parser.parse_args()
+    if args.timings_file:
+        export_timings(args.timings_file, args.timings_format)
 
-    asyncio.run(post_tweet(args.token, args.text, args.media))
+    print_result(asyncio.run(post_tweet(
+        args.token, args.text, args.media,
+        block_resources=args.block_resources,
+        persistent=args.persistent_profile,
+        human_typing=args.human_typing,
+        run_mode=args.run_mode
+    )))
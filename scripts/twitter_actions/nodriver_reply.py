@@ -1,178 +1,121 @@
 import asyncio
 import sys
 import argparse
-from utils import setup_browser, print_success, print_error
+from utils import success_response, error_response, print_result, start_timings, phase, export_timings, add_timing_arguments
+from utils import attach_media, insert_text, submit_and_capture
+from session_pool import open_session
+from display import add_run_mode_argument
+from waits import wait_for_any_selector, wait_for_navigation
 import nodriver as uc
 
-async def reply_tweet(auth_token, target_url, text, media=None):
-    browser, page = await setup_browser(auth_token)
-    if not browser or not page:
-        return
-
+async def reply_tweet(auth_token, target_url, text, media=None, pool=None, block_resources=False, persistent=False, human_typing=False, run_mode=None):
+    start_timings()
     try:
-        # 1. Navigate to target tweet
-        await page.get(target_url)
-        # Give initial time for the framework to start loading
-        await asyncio.sleep(2)
+        # A new browser opens straight on the target tweet
+        session = await open_session(
+            auth_token, pool,
+            block_profile='actions' if block_resources else None,
+            persistent=persistent,
+            run_mode=run_mode,
+            start_url=target_url
+        )
+    except Exception as e:
+        return error_response(f"Failed to initialize browser: {str(e)}")
+    page = session.page
+    phase('session')
+    # Only a session that finished cleanly goes back to the pool; after a
+    # failure the page may hold a half-filled composer or an error page
+    succeeded = False
 
-        # 2. Find reply textarea with polling (X.com can be slow)
-        textarea = None
-        selectors = [
+    try:
+        # 1. Navigate to target tweet (a warm pooled session is still on its last page)
+        if session.reused:
+            await page.get(target_url)
+            # Wait for the document itself; the textarea poll below waits for the React app
+            await wait_for_navigation(page, timeout=10)
+            phase('targetLoad')
+
+        # 2. Find reply textarea (X.com can be slow). The error page is probed in the
+        # same call so a deleted or protected tweet fails fast instead of timing out.
+        matched, textarea = await wait_for_any_selector(page, [
             '[data-testid="tweetTextarea_0"]',
-            '[aria-label="Post text"]'
-        ]
-        
-        for _ in range(20): # Poll for up to 10 seconds (20 * 0.5s)
-            for selector in selectors:
-                try:
-                    textarea = await page.select(selector)
-                    if textarea:
-                        break
-                except:
-                    pass
-            if textarea:
-                break
-            await asyncio.sleep(0.5)
+            '[aria-label="Post text"]',
+            '.errorContainer'
+        ], timeout=10)
 
-        if not textarea:
+        if matched == '.errorContainer':
             # Maybe the tweet is deleted or restricted
-            error_container = None
-            try:
-                error_container = await page.select('.errorContainer')
-            except:
-                pass
-                
-            if error_container:
-                print_error("Target tweet exists but is an error page (e.g. deleted or protected).")
-                return
-            
-            print_error("Failed to find reply textarea on target tweet page.")
-            return
+            return error_response("Target tweet exists but is an error page (e.g. deleted or protected).")
+
+        if not textarea:
+            return error_response("Failed to find reply textarea on target tweet page.")
+        phase('composer')
 
         # 3. Type Reply
         await textarea.click()
         await asyncio.sleep(0.3)
-        await textarea.send_keys(text)
-        await asyncio.sleep(1)
+        await insert_text(page, text, human=human_typing)
+        phase('typing')
 
         # 4. Handle Media if present
         if media:
-            try:
-                file_input = await page.select('input[type="file"][accept*="image"]')
-                if file_input:
-                    await file_input.send_file(media)
-                    await asyncio.sleep(3)
-                else:
-                    print("Could not find file input for media.")
-            except Exception as me:
-                print(f"Failed to attach media: {str(me)}")
+            media_error = await attach_media(page, media)
+            if media_error:
+                return error_response(media_error)
+            phase('mediaUpload')
 
         # 5. Click Reply Button
         # The reply button often shares the same testid as the post button
-        reply_btn = None
         btn_selectors = [
             '[data-testid="tweetButtonInline"]:not([disabled])',
             '[data-testid="tweetButton"]:not([disabled])'
         ]
-        
-        for _ in range(10): # Poll for up to 5 seconds
-            for selector in btn_selectors:
-                try:
-                    reply_btn = await page.select(selector)
-                    if reply_btn:
-                        break
-                except:
-                    pass
-            if reply_btn:
-                break
-            await asyncio.sleep(0.5)
+        _, reply_btn = await wait_for_any_selector(page, btn_selectors, timeout=5)
 
         if not reply_btn:
             # Sometimes if clicking the textarea didn't enable the button, 
             # we need to simulate typing more aggressively
             await textarea.send_keys(' ')
             await page.send(uc.cdp.input_.dispatch_key_event(type_="char", text="\b")) # Backspace
-            await asyncio.sleep(1)
-            
-            for _ in range(5):
-                for selector in btn_selectors:
-                    try:
-                        reply_btn = await page.select(selector)
-                        if reply_btn:
-                            break
-                    except:
-                        pass
-                if reply_btn:
-                    break
-                await asyncio.sleep(0.5)
-
-        if reply_btn:
-            await reply_btn.click()
-        else:
-            print("Reply button not found nateively, attempting Ctrl+Enter fallback...")
-            await page.send(uc.cdp.input_.dispatch_key_event(
-                type_="rawKeyDown",
-                windows_virtual_key_code=17, # Ctrl
-                modifiers=2
-            ))
-            await page.send(uc.cdp.input_.dispatch_key_event(
-                type_="keyDown",
-                windows_virtual_key_code=13, # Enter
-                modifiers=2 
-            ))
-            await page.send(uc.cdp.input_.dispatch_key_event(
-                type_="keyUp",
-                windows_virtual_key_code=13,
-                modifiers=2
-            ))
-            await page.send(uc.cdp.input_.dispatch_key_event(
-                type_="keyUp",
-                windows_virtual_key_code=17,
-                modifiers=0
-            ))
-
-        await asyncio.sleep(4)
 
-        # 5. Verify and get ID
-        # Since it's an inline composer, if it disappears or resets, it likely posted
-        try:
-             # Check if original typed text is gone
-             val = getattr(textarea, 'value', '')
-             if text in val:
-                 print_error("Reply button clicked, but text remained in composer. Reply likely failed.")
-                 return
-        except:
-             pass
+        # Submit and read the new reply's ID
+        tweet_id, pacing_wait_ms, submit_error = await submit_and_capture(
+            page, auth_token, 'reply', text, btn_selectors, composer=textarea, button_timeout=3.5
+        )
+        if submit_error:
+            return error_response(submit_error)
 
-        tweet_id = None
-        try:
-            toast = await page.select('[data-testid="toast"]')
-            if toast:
-                links = await toast.query_selector_all('a[href*="/status/"]')
-                for link in links:
-                    href = getattr(link, 'href', '')
-                    if '/status/' in href:
-                        tweet_id = href.split('/status/')[1].split('/')[0]
-                        break
-        except:
-            pass
-
-        print_success({
+        succeeded = True
+        return success_response({
             "message": "Reply posted successfully",
-            "replyId": tweet_id
+            "replyId": tweet_id,
+            "pacingWaitMs": pacing_wait_ms
         })
 
     except Exception as e:
-        print_error(f"Error during reply: {str(e)}")
+        return error_response(f"Error during reply: {str(e)}")
     finally:
-        browser.stop()
+        await session.release(discard=not succeeded)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--token', required=True, help='Twitter auth_token')
     parser.add_argument('--target', required=True, help='Target tweet URL')
     parser.add_argument('--text', required=True, help='Text to reply')
-    parser.add_argument('--media', required=False, help='Path to media file to upload')
+    parser.add_argument('--media', nargs='+', required=False, help='Path(s) of media files to upload (up to 4 images, or one video/GIF)')
+    parser.add_argument('--block-resources', action='store_true', help='Skip images, video, fonts and analytics while acting')
+    parser.add_argument('--persistent-profile', action='store_true', help='Keep a Chrome profile per account so later runs start logged in')
+    parser.add_argument('--human-typing', action='store_true', help='Type word by word with short pauses instead of inserting the text at once')
+    add_run_mode_argument(parser)
+    add_timing_arguments(parser)
     args = parser.parse_args()
-
-    asyncio.run(reply_tweet(args.token, args.target, args.text, args.media))
+    if args.timings_file:
+        export_timings(args.timings_file, args.timings_format)
+
+    print_result(asyncio.run(reply_tweet(
+        args.token, args.target, args.text, args.media,
+        block_resources=args.block_resources,
+        persistent=args.persistent_profile,
+        human_typing=args.human_typing,
+        run_mode=args.run_mode
+    )))
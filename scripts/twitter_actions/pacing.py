@@ -0,0 +1,153 @@
+"""
+Cross-process pacing of account actions, backed by SQLite.
+
+Every post/reply/quote takes a token from two buckets before it submits:
+one for the whole account ("*") and one for the action type. A bucket holds
+up to `burst` tokens and gains one every `interval` seconds. Taking a token
+from an empty bucket reserves the next one, so concurrent processes acting
+for the same account queue up in order instead of polling, and each one
+sleeps only as long as its reservation requires.
+
+Rules can be overridden with XACTIONS_PACING, a JSON object of
+action -> [burst, interval], e.g. '{"*": [1, 10], "post": [20, 60]}', or
+turned off with XACTIONS_PACING=off. An interval of 0 (or null) removes that
+bucket. Tokens are stored as hashes.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from cache import DEFAULT_CACHE_DIR
+
+# action -> (burst, interval in seconds). "*" covers every action of an
+# account and keeps the 5s gap the campaign runners used to sleep; the
+# per-action buckets cap the sustained rate at 100 an hour.
+PACING_RULES = {
+    '*': (1, 5),
+    'post': (50, 36),
+    'reply': (50, 36),
+    'quote': (50, 36),
+}
+
+
+def load_rules():
+    """PACING_RULES with the XACTIONS_PACING overrides applied, or {} when pacing is off."""
+    override = os.environ.get('XACTIONS_PACING', '').strip()
+    if override.lower() == 'off':
+        return {}
+    rules = dict(PACING_RULES)
+    if override:
+        overrides = json.loads(override)
+        if not isinstance(overrides, dict):
+            raise ValueError('XACTIONS_PACING must be a JSON object of action -> [burst, interval]')
+        rules.update({action: parse_rule(action, rule) for action, rule in overrides.items()})
+    return {action: rule for action, rule in rules.items() if rule}
+
+
+def parse_rule(action, rule):
+    """(burst, interval) from an XACTIONS_PACING entry, or None for no bucket. Raises ValueError."""
+    if rule is None:
+        return None
+    if (not isinstance(rule, (list, tuple)) or len(rule) != 2
+            or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in rule)):
+        raise ValueError(f'Pacing rule for {action!r} must be [burst, interval], got {rule!r}')
+    burst, interval = rule
+    if interval == 0:
+        return None
+    if burst < 1 or interval < 0:
+        raise ValueError(f'Pacing rule for {action!r} needs burst >= 1 and interval >= 0, got {rule!r}')
+    return (burst, interval)
+
+
+def account_key(auth_token):
+    return hashlib.sha256(auth_token.encode()).hexdigest()[:16]
+
+
+class Pacer:
+    def __init__(self, path=None, rules=None):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, 'pacing.sqlite3')
+        self.rules = load_rules() if rules is None else rules
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS buckets ('
+                ' account TEXT NOT NULL,'
+                ' action TEXT NOT NULL,'
+                ' tokens REAL NOT NULL,'
+                ' updated_at REAL NOT NULL,'
+                ' PRIMARY KEY (account, action))'
+            )
+
+    @contextmanager
+    def _connect(self):
+        # isolation_level=None so BEGIN IMMEDIATE below controls the transaction
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def reserve(self, auth_token, action):
+        """
+        Takes a token for `action` and returns the seconds to wait before
+        acting on it. The token is taken even when the caller has to wait.
+        """
+        buckets = [(name, self.rules[name]) for name in ('*', action) if self.rules.get(name)]
+        if not buckets:
+            return 0.0
+
+        account = account_key(auth_token)
+        now = time.time()
+        wait = 0.0
+        with self._connect() as conn:
+            # Write lock up front: read-modify-write must not interleave between processes
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for name, (burst, interval) in buckets:
+                    row = conn.execute(
+                        'SELECT tokens, updated_at FROM buckets WHERE account = ? AND action = ?',
+                        (account, name)
+                    ).fetchone()
+                    tokens, updated_at = row if row else (burst, now)
+                    tokens = min(burst, tokens + max(0.0, now - updated_at) / interval) - 1
+                    wait = max(wait, -tokens * interval)
+                    conn.execute(
+                        'INSERT INTO buckets (account, action, tokens, updated_at) VALUES (?, ?, ?, ?)'
+                        ' ON CONFLICT(account, action) DO UPDATE SET'
+                        ' tokens = excluded.tokens, updated_at = excluded.updated_at',
+                        (account, name, tokens, now)
+                    )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return wait
+
+    async def wait(self, auth_token, action):
+        """Waits until `action` may run for this account. Returns the seconds waited."""
+        wait = await asyncio.to_thread(self.reserve, auth_token, action)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+_pacer = None
+
+
+async def pace(auth_token, action):
+    """
+    Waits for the shared per-account pacing of `action` and returns the wait
+    in milliseconds. Pacing problems never block an action: a broken store
+    counts as no wait.
+    """
+    global _pacer
+    try:
+        if _pacer is None:
+            _pacer = Pacer()
+        return round(await _pacer.wait(auth_token, action) * 1000)
+    except (sqlite3.Error, OSError, ValueError, TypeError, ArithmeticError):
+        return 0
@@ -0,0 +1,315 @@
+import asyncio
+import time
+from collections import OrderedDict
+from utils import setup_browser, setup_context, close_context, attach_to_response, detach_from_response
+from display import start_browser
+from timings import phase
+from blocking import RequestBlocker
+
+
+class BrowserSession:
+    """
+    An authenticated browser/page pair for one auth token.
+    Call release() when the action is done: pooled sessions go back to their
+    pool, one-shot sessions stop their browser. While a session with a request
+    blocker is held, responses carry its counters under "network".
+    A session opened through BrowserHosts owns a browser context, not the
+    browser; stopping it closes just that context.
+    """
+
+    def __init__(self, auth_token, browser=None, page=None, pool=None, blocker=None, hosts=None):
+        self.auth_token = auth_token
+        self.browser = browser
+        self.page = page
+        self.pool = pool
+        self.blocker = blocker
+        self.hosts = hosts
+        self.in_use = False
+        self.reused = False
+        self.last_used = time.monotonic()
+
+    def report_network(self):
+        if self.blocker:
+            attach_to_response('network', self.blocker.stats)
+
+    async def release(self, discard=False):
+        if self.blocker:
+            detach_from_response('network')
+        if self.pool:
+            await self.pool.release(self, discard=discard)
+        else:
+            await self.stop()
+
+    async def stop(self):
+        try:
+            if self.hosts and self.page:
+                await self.hosts.close(self.browser, self.page)
+            elif self.browser:
+                self.browser.stop()
+        except Exception:
+            pass
+        self.browser = None
+        self.page = None
+
+
+class BrowserHost:
+    """One Chrome and the number of account contexts open in it."""
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.accounts = 0
+
+
+class BrowserHosts:
+    """
+    Runs several accounts per Chrome. Each account gets its own browser
+    context (see utils.setup_context), so cookies, storage and cache stay
+    separate while the browser process, GPU process and network service are
+    shared. A new account goes to the least loaded Chrome with fewer than
+    `accounts_per_browser` contexts; another Chrome is started only when all
+    are full, and a Chrome is stopped once its last context is closed.
+    """
+
+    def __init__(self, accounts_per_browser=4, run_mode=None):
+        self.accounts_per_browser = max(1, accounts_per_browser)
+        self.run_mode = run_mode
+        self._hosts = []
+        self._lock = asyncio.Lock()
+
+    async def open(self, auth_token, blocker=None, start_url=None):
+        """Opens auth_token in a new context and returns (browser, page)."""
+        host = await self._claim()
+        try:
+            page = await setup_context(host.browser, auth_token, blocker=blocker, start_url=start_url)
+        except Exception:
+            await self._unclaim(host.browser)
+            raise
+        return host.browser, page
+
+    async def close(self, browser, page):
+        """Closes the context of `page`; stops `browser` when nothing else runs in it."""
+        await close_context(browser, page)
+        await self._unclaim(browser)
+
+    def stop(self):
+        """Stops every Chrome, whatever is still open in it."""
+        for host in self._hosts:
+            try:
+                host.browser.stop()
+            except Exception:
+                pass
+        self._hosts = []
+
+    async def _claim(self):
+        async with self._lock:
+            self._hosts = [h for h in self._hosts if not h.browser.stopped]
+            available = [h for h in self._hosts if h.accounts < self.accounts_per_browser]
+            if available:
+                host = min(available, key=lambda h: h.accounts)
+            else:
+                # Started under the lock so a burst of accounts fills one Chrome
+                # instead of each starting its own
+                host = BrowserHost(await start_browser(self.run_mode))
+                self._hosts.append(host)
+                phase('browserLaunch')
+            host.accounts += 1
+            return host
+
+    async def _unclaim(self, browser):
+        async with self._lock:
+            host = next((h for h in self._hosts if h.browser is browser), None)
+            if not host:
+                return
+            host.accounts -= 1
+            if host.accounts <= 0:
+                self._hosts.remove(host)
+                try:
+                    browser.stop()
+                except Exception:
+                    pass
+
+
+async def open_session(auth_token, pool=None, block_profile=None, persistent=False, start_url=None, run_mode=None):
+    """
+    Returns a BrowserSession for auth_token, from `pool` when one is given,
+    otherwise backed by a freshly started browser. `block_profile` names a
+    blocking.BLOCK_PROFILES entry and `persistent` keeps a per-account Chrome
+    profile (see utils.setup_browser), `run_mode` is a display.RUN_MODES entry;
+    pooled sessions use the pool's settings.
+    A new browser opens on `start_url` (default /home), a reused one stays where it was.
+    """
+    if pool:
+        session = await pool.acquire(auth_token, start_url)
+    else:
+        blocker = RequestBlocker.from_profile(block_profile) if block_profile else None
+        browser, page = await setup_browser(
+            auth_token, blocker=blocker, persistent=persistent, start_url=start_url, run_mode=run_mode
+        )
+        session = BrowserSession(auth_token, browser, page, blocker=blocker)
+        session.in_use = True
+
+    session.report_network()
+    return session
+
+
+class SessionPool:
+    """
+    Keeps authenticated browsers warm between actions, keyed by auth token.
+
+    At most `max_sessions` browsers are alive at once; when a new token needs
+    a slot the least recently used idle session is stopped. Sessions idle for
+    longer than `idle_ttl` seconds are stopped in the background. A session
+    serves one action at a time, other callers for the same token wait.
+
+    With accounts_per_browser > 1 sessions are browser contexts packed into
+    shared Chrome processes (see BrowserHosts) instead of a Chrome each;
+    `max_sessions` still counts accounts.
+    """
+
+    def __init__(self, max_sessions=4, idle_ttl=300, block_profile=None, persistent=False, run_mode=None,
+                 accounts_per_browser=1):
+        if persistent and accounts_per_browser > 1:
+            raise ValueError("Persistent profiles need a Chrome per account; use accounts_per_browser=1.")
+        self.max_sessions = max(1, max_sessions)
+        self.idle_ttl = idle_ttl
+        self.block_profile = block_profile
+        self.persistent = persistent
+        self.run_mode = run_mode
+        self.hosts = BrowserHosts(accounts_per_browser, run_mode) if accounts_per_browser > 1 else None
+        self._sessions = OrderedDict()
+        self._cond = asyncio.Condition()
+        self._reaper = None
+
+    async def acquire(self, auth_token, start_url=None):
+        self._ensure_reaper()
+        evicted = []
+        is_new = False
+
+        async with self._cond:
+            while True:
+                session = self._sessions.get(auth_token)
+                if session:
+                    if not session.in_use:
+                        break
+                    await self._cond.wait()
+                    continue
+
+                if len(self._sessions) < self.max_sessions:
+                    session = BrowserSession(auth_token, pool=self)
+                    self._sessions[auth_token] = session
+                    is_new = True
+                    break
+
+                # Full: evict the least recently used idle session
+                victim = next((s for s in self._sessions.values() if not s.in_use), None)
+                if victim:
+                    del self._sessions[victim.auth_token]
+                    evicted.append(victim)
+                    continue
+
+                await self._cond.wait()
+
+            session.in_use = True
+            self._sessions.move_to_end(auth_token)
+
+        for victim in evicted:
+            await victim.stop()
+
+        if not is_new and not await self._is_alive(session):
+            await session.stop()
+            is_new = True
+
+        if is_new:
+            try:
+                session.blocker = RequestBlocker.from_profile(self.block_profile) if self.block_profile else None
+                if self.hosts:
+                    session.hosts = self.hosts
+                    session.browser, session.page = await self.hosts.open(
+                        auth_token, blocker=session.blocker, start_url=start_url
+                    )
+                else:
+                    session.browser, session.page = await setup_browser(
+                        auth_token,
+                        blocker=session.blocker,
+                        persistent=self.persistent,
+                        start_url=start_url,
+                        run_mode=self.run_mode
+                    )
+            except Exception:
+                await self.release(session, discard=True)
+                raise
+
+        session.reused = not is_new
+        return session
+
+    async def release(self, session, discard=False):
+        async with self._cond:
+            session.in_use = False
+            session.last_used = time.monotonic()
+            if discard and self._sessions.get(session.auth_token) is session:
+                del self._sessions[session.auth_token]
+            self._cond.notify_all()
+
+        if discard:
+            await session.stop()
+
+    async def close(self):
+        """Stops every pooled browser and the idle reaper."""
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+
+        async with self._cond:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+            self._cond.notify_all()
+
+        for session in sessions:
+            await session.stop()
+        if self.hosts:
+            self.hosts.stop()
+
+    async def evict_idle(self):
+        """Stops sessions that have not been used for `idle_ttl` seconds."""
+        now = time.monotonic()
+        async with self._cond:
+            expired = [
+                s for s in self._sessions.values()
+                if not s.in_use and now - s.last_used >= self.idle_ttl
+            ]
+            for session in expired:
+                del self._sessions[session.auth_token]
+            if expired:
+                self._cond.notify_all()
+
+        for session in expired:
+            await session.stop()
+
+    async def stop_idle(self):
+        """Stops every session that is not serving an action right now."""
+        async with self._cond:
+            idle = [s for s in self._sessions.values() if not s.in_use]
+            for session in idle:
+                del self._sessions[session.auth_token]
+            if idle:
+                self._cond.notify_all()
+
+        for session in idle:
+            await session.stop()
+        return len(idle)
+
+    def _ensure_reaper(self):
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_forever())
+
+    async def _reap_forever(self):
+        while True:
+            await asyncio.sleep(max(1, min(self.idle_ttl / 2, 30)))
+            await self.evict_idle()
+
+    async def _is_alive(self, session):
+        try:
+            await asyncio.wait_for(session.page.evaluate('1'), timeout=5)
+            return True
+        except Exception:
+            return False
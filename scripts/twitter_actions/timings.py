@@ -0,0 +1,136 @@
+"""
+Per-phase wall time for the scripts' JSON output.
+
+Each task keeps its own Timings. phase(name) closes the current phase, so
+the phases of one run never overlap and add up to roughly "total". utils
+adds the timings of the current task to every response it builds. This
+module only uses the standard library, so it can be imported where nodriver
+is not needed.
+"""
+import contextvars
+import itertools
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+_timings = contextvars.ContextVar('timings', default=None)
+
+# (path, format, script) set by export_timings
+_export = None
+
+# Numbers the OpenMetrics files written by this process
+_sequence = itertools.count()
+
+
+class Timings:
+    """Wall time per phase of one script run, in milliseconds."""
+
+    def __init__(self):
+        self.started = self.last = time.perf_counter()
+        self.phases = {}
+
+    def phase(self, name):
+        """Records the time since the previous phase ended (or since start) under `name`."""
+        now = time.perf_counter()
+        self.phases[name] = round(self.phases.get(name, 0) + (now - self.last) * 1000, 1)
+        self.last = now
+
+    def as_dict(self):
+        return {**self.phases, "total": round((time.perf_counter() - self.started) * 1000, 1)}
+
+
+def start_timings():
+    """
+    Starts a fresh set of phase timings for the current task. Responses built
+    afterwards carry them as "timings".
+    """
+    timings = Timings()
+    _timings.set(timings)
+    return timings
+
+
+def current_timings():
+    return _timings.get()
+
+
+def phase(name):
+    """Ends the current phase of this task's timings, starting them if needed."""
+    timings = _timings.get() or start_timings()
+    timings.phase(name)
+
+
+def with_timings(result):
+    """Returns `result` with the current task's timings added, for scripts that build their own dicts."""
+    timings = _timings.get()
+    return {**result, "timings": timings.as_dict()} if timings and 'timings' not in result else result
+
+
+def export_timings(path, fmt='ndjson', script=None):
+    """
+    Makes write_timings (called by utils.print_result) record the timings of
+    every printed response. With fmt='ndjson' they are appended to the file
+    `path` as one JSON line each. With fmt='openmetrics' `path` is a
+    directory that gets one complete OpenMetrics exposition (ending in
+    "# EOF") per response, so concurrent runs never share a file; load them
+    with e.g. `promtool tsdb create-blocks-from openmetrics <file> <dir>`.
+    """
+    global _export
+    script = script or os.path.splitext(os.path.basename(sys.argv[0]))[0]
+    _export = (path, fmt, script)
+
+
+def write_timings(result):
+    """Appends the timings in `result` to the file set with export_timings, if any."""
+    if not _export or not result.get('timings'):
+        return
+    path, fmt, script = _export
+    now = time.time()
+
+    if fmt == 'openmetrics':
+        write_exposition(path, script, result, now)
+        return
+
+    record = json.dumps({
+        "time": datetime.fromtimestamp(now, timezone.utc).isoformat(timespec='seconds'),
+        "script": script,
+        "success": bool(result.get('success')),
+        "timings": result['timings'],
+    }) + '\n'
+
+    # One write per record so concurrent scripts do not interleave lines
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(record)
+
+
+def write_exposition(directory, script, result, now):
+    """Writes the timings in `result` as one OpenMetrics exposition file in `directory`."""
+    success = 'true' if result.get('success') else 'false'
+    lines = [
+        '# TYPE xactions_phase_seconds gauge',
+        '# UNIT xactions_phase_seconds seconds',
+        '# HELP xactions_phase_seconds Wall time of one script phase.',
+    ]
+    for name, ms in result['timings'].items():
+        lines.append(
+            f'xactions_phase_seconds{{script="{script}",phase="{name}",success="{success}"}} '
+            f'{ms / 1000:.4f} {now:.3f}'
+        )
+    lines.append('# EOF')
+
+    os.makedirs(directory, exist_ok=True)
+    name = f'{script}-{int(now * 1000)}-{os.getpid()}-{next(_sequence)}.om'
+    # Written under a temporary name so readers never see a partial file
+    temp = os.path.join(directory, f'.{name}.tmp')
+    with open(temp, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(temp, os.path.join(directory, name))
+
+
+def add_timing_arguments(parser):
+    parser.add_argument('--timings-file',
+                        help='Append phase timings to this file (ndjson), or write one file per result into '
+                             'this directory (openmetrics)')
+    parser.add_argument('--timings-format', choices=['ndjson', 'openmetrics'], default='ndjson',
+                        help='Format of --timings-file')
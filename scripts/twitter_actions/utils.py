@@ -1,52 +1,414 @@
-import asyncio
 import json
+import os
+import hashlib
+import ipaddress
+import contextvars
+import asyncio
+import random
+import re
+import time
+from urllib.parse import urlparse
 import nodriver as uc
+from waits import wait_for_navigation, wait_for_selector, wait_for_any_selector, UploadWatcher, ResponseWatcher
+from display import start_browser, apply_stealth
+from pacing import pace
+from timings import start_timings, phase, current_timings, export_timings, write_timings, add_timing_arguments
+
+# (key, provider) pairs whose values are merged into every response built in the
+# current task, e.g. the request blocker's counters.
+_response_extras = contextvars.ContextVar('response_extras', default=())
+
+# Persistent per-account Chrome profiles (setup_browser(persistent=True))
+PROFILES_DIR = os.environ.get('XACTIONS_PROFILE_DIR') or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.profiles'
+)
+
+# Seconds the auth cookie of a persistent profile stays valid in Chrome
+PERSISTENT_COOKIE_LIFETIME = 365 * 24 * 3600
+
+LOGGED_OUT_MARKERS = ('/i/flow/login', '/login', '/logout')
+
+# Where x.com is served from; the offline benchmarks point this at a local stand-in
+X_BASE_URL = (os.environ.get('XACTIONS_X_BASE_URL') or 'https://x.com').rstrip('/')
+X_HOST = urlparse(X_BASE_URL).hostname
+
+# GraphQL operations whose response carries the created tweet; long posts use CreateNoteTweet
+CREATE_TWEET_OPERATIONS = ('/CreateTweet', '/CreateNoteTweet')
+
+# Media upload endpoints (upload.x.com/i/media/upload.json, and the older 1.1 path)
+MEDIA_UPLOAD_PATHS = ('/i/media/upload', '/1.1/media/upload')
+MAX_MEDIA_FILES = 4
+
+# Upload timeout: a base for the round trips plus time per byte at a slow
+# uplink, which also leaves room for X's video processing
+MEDIA_UPLOAD_BASE_TIMEOUT = 15
+MEDIA_UPLOAD_BYTES_PER_SECOND = 256 * 1024
+MEDIA_UPLOAD_MAX_TIMEOUT = 600
+
+# Pause in seconds between word-sized chunks when typing like a person
+HUMAN_TYPING_DELAY = (0.08, 0.35)
 
-async def setup_browser(auth_token):
+async def setup_browser(auth_token, blocker=None, persistent=False, start_url=None, run_mode=None):
     """
     Initializes a nodriver browser instance with the given auth token.
-    Returns the browser and page objects.
+    Returns the browser and page objects, with the page on `start_url` (default /home).
+    Raises if the browser cannot be started.
+    If a RequestBlocker is given it is attached to the page before start_url loads.
+
+    With persistent=True the browser keeps a user-data directory per account
+    (see profile_dir), so cookies and the HTTP cache survive between runs and a
+    warm start goes straight to start_url. The cookie is only injected when the
+    stored session is missing or no longer logged in. Chrome locks the
+    directory, so one token can only have one persistent browser at a time.
+
+    `run_mode` picks headful, stealth headless or a pooled Xvfb display (see
+    display.py); the default comes from XACTIONS_RUN_MODE.
     """
+    start_url = start_url or x_url('/home')
     try:
-        # Start browser in interactive mode (headless=False) to bypass Cloudflare/Bot detection
-        # nodriver handles stealth automatically, adding extra args can break it.
-        browser = await uc.start(headless=False)
-        
-        # Navigate to set the cookie
-        page = await browser.get('https://x.com')
-        
-        # Create cookie object and set it
-        await page.send(uc.cdp.network.set_cookie(
-            name='auth_token',
-            value=auth_token,
-            domain='.x.com',
-            path='/',
-            secure=True,
-            http_only=True
-        ))
+        if persistent:
+            browser = await start_browser(run_mode, user_data_dir=profile_dir(auth_token))
+        else:
+            browser = await start_browser(run_mode)
+        phase('browserLaunch')
+
+        # The blocker goes on before anything from x.com loads
+        page = await browser.get('about:blank')
+        if blocker:
+            await blocker.attach(page)
+        if not persistent:
+            # Navigate to set the cookie
+            await page.get(x_url())
+
+        warm = persistent and await has_auth_cookie(page, auth_token)
+        if not warm:
+            await inject_auth_cookie(page, auth_token, persistent=persistent)
+        phase('cookieInject')
         
-        # Navigate to the home feed with the newly injected auth token
-        await page.get('https://x.com/home')
+        # Navigate to the target with the stored or newly injected auth token
+        await page.get(start_url)
         
-        # Give it a moment to load the initial DOM
-        await asyncio.sleep(3)
+        # Actions wait for their own elements; only the document itself is needed here
+        current_url = await wait_for_navigation(page, X_HOST, timeout=10)
+
+        if warm and is_logged_out_url(current_url):
+            # The stored session expired: start over from a clean cookie jar
+            await page.send(uc.cdp.network.clear_browser_cookies())
+            await inject_auth_cookie(page, auth_token, persistent=True)
+            await page.get(start_url)
+            await wait_for_navigation(page, X_HOST, timeout=10)
+        phase('startPage')
         
         return browser, page
-    except Exception as e:
-        print_error(f"Failed to initialize browser: {str(e)}")
+    except Exception:
         if 'browser' in locals() and browser:
             browser.stop()
-        return None, None
+        raise
 
-def print_success(data):
-    """Prints a standard JSON success response for Node.js to parse."""
+async def setup_context(browser, auth_token, blocker=None, start_url=None):
+    """
+    Like setup_browser, but opens the account in a new browser context of an
+    already running `browser` instead of starting a Chrome of its own.
+    Contexts have separate cookie jars, storage and cache, so several
+    accounts can share one Chrome without their auth_token cookies mixing.
+    Returns the page, on `start_url` (default /home). Close it with close_context.
+    """
+    start_url = start_url or x_url('/home')
+    page = await browser.create_context('about:blank', new_window=True)
+    phase('contextOpen')
+    try:
+        if getattr(browser.config, 'headless', False):
+            # The stealth user agent is set per target; new contexts start without it
+            await apply_stealth(browser, page)
+        if blocker:
+            await blocker.attach(page)
+
+        # Navigate to set the cookie
+        await page.get(x_url())
+        await inject_auth_cookie(page, auth_token)
+        phase('cookieInject')
+
+        await page.get(start_url)
+        await wait_for_navigation(page, X_HOST, timeout=10)
+        phase('startPage')
+        return page
+    except Exception:
+        await close_context(browser, page)
+        raise
+
+async def close_context(browser, page):
+    """Closes `page` and disposes its browser context, with the cookies in it."""
+    context_id = getattr(page.target, 'browser_context_id', None)
+    try:
+        await page.close()
+    except Exception:
+        pass
+    if context_id:
+        try:
+            await browser_connection(browser).send(uc.cdp.target.dispose_browser_context(context_id))
+        except Exception:
+            pass
+
+def browser_connection(browser):
+    """The browser-level CDP connection (older nodriver versions keep it separately)."""
+    return getattr(browser, 'connection', None) or browser
+
+def x_url(path=''):
+    """Absolute URL of `path` on x.com (or on XACTIONS_X_BASE_URL)."""
+    return X_BASE_URL + path
+
+def profile_dir(auth_token):
+    """Chrome user-data directory for one account, keyed by a hash of its token."""
+    digest = hashlib.sha256(auth_token.encode()).hexdigest()[:16]
+    return os.path.join(PROFILES_DIR, digest)
+
+async def has_auth_cookie(page, auth_token):
+    """True if the browser already holds `auth_token` as its x.com session cookie."""
+    cookies = await page.send(uc.cdp.network.get_cookies(urls=[x_url()]))
+    return any(c.name == 'auth_token' and c.value == auth_token for c in cookies)
+
+async def inject_auth_cookie(page, auth_token, persistent=False):
+    # Create cookie object and set it. Real domains get a leading dot so the
+    # cookie reaches subdomains (upload.x.com); localhost and IPs cannot have one.
+    # Chrome only writes cookies with an expiry to the profile, so persistent
+    # profiles get one; otherwise it is a session cookie.
+    try:
+        ipaddress.ip_address(X_HOST)
+        scope = {"url": x_url('/')}
+    except ValueError:
+        scope = {"url": x_url('/')} if X_HOST == 'localhost' else {"domain": f'.{X_HOST}'}
+
+    await page.send(uc.cdp.network.set_cookie(
+        name='auth_token',
+        value=auth_token,
+        path='/',
+        secure=X_BASE_URL.startswith('https://'),
+        http_only=True,
+        expires=uc.cdp.network.TimeSinceEpoch(time.time() + PERSISTENT_COOKIE_LIFETIME) if persistent else None,
+        **scope
+    ))
+
+def is_logged_out_url(url):
+    """True for the pages x.com redirects to when the session is not valid."""
+    return any(marker in (url or '') for marker in LOGGED_OUT_MARKERS)
+
+def created_tweet_id(body):
+    """Returns the new tweet's rest_id from a CreateTweet/CreateNoteTweet response body, or None."""
+    data = (body or {}).get('data') or {}
+    for key in ('create_tweet', 'notetweet_create'):
+        result = ((data.get(key) or {}).get('tweet_results') or {}).get('result') or {}
+        # Limited-visibility tweets come wrapped as {"tweet": {...}}
+        rest_id = result.get('rest_id') or (result.get('tweet') or {}).get('rest_id')
+        if rest_id:
+            return rest_id
+    return None
+
+def graphql_error(body):
+    """Returns the error messages of a GraphQL response body joined into one string, or None."""
+    errors = (body or {}).get('errors') or []
+    messages = [e['message'] for e in errors if isinstance(e, dict) and e.get('message')]
+    return '; '.join(messages) or None
+
+async def tweet_id_from_toast(toast):
+    """Scrapes the status ID from the "Your post was sent" toast's link, or None."""
+    try:
+        if toast:
+            links = await toast.query_selector_all('a[href*="/status/"]')
+            for link in links:
+                href = getattr(link, 'href', '')
+                if '/status/' in href:
+                    return href.split('/status/')[1].split('/')[0]
+    except Exception:
+        pass
+    return None
+
+async def press_enter(page):
+    """Sends a native Enter key press, which X's draft editor turns into a new line."""
+    for type_ in ('keyDown', 'keyUp'):
+        await page.send(uc.cdp.input_.dispatch_key_event(
+            type_=type_, key='Enter', code='Enter', windows_virtual_key_code=13
+        ))
+
+async def insert_text(page, text, human=False):
+    """
+    Types `text` into the focused editor with Input.insertText, one call per
+    line instead of one key event per character. X's draft editor drops "\\n"
+    in inserted text, so lines are joined with Enter key presses. With
+    human=True the text goes in word by word with short random pauses.
+    """
+    for index, line in enumerate(text.replace('\r\n', '\n').split('\n')):
+        if index:
+            await press_enter(page)
+        chunks = re.findall(r'\s*\S+\s*|\s+', line) if human else [line]
+        for chunk in chunks:
+            if not chunk:
+                continue
+            await page.send(uc.cdp.input_.insert_text(text=chunk))
+            if human:
+                await asyncio.sleep(random.uniform(*HUMAN_TYPING_DELAY))
+
+def media_paths(media):
+    """Returns `media` (a path, a list of paths or None) as a list of absolute paths."""
+    if not media:
+        return []
+    if isinstance(media, (str, os.PathLike)):
+        media = [media]
+    return [os.path.abspath(path) for path in media if path]
+
+def upload_timeout(paths):
+    """Seconds to allow for uploading `paths`, scaled by their total size."""
+    size = sum(os.path.getsize(path) for path in paths)
+    return min(MEDIA_UPLOAD_BASE_TIMEOUT + size / MEDIA_UPLOAD_BYTES_PER_SECOND, MEDIA_UPLOAD_MAX_TIMEOUT)
+
+async def attach_media(page, media):
+    """
+    Attaches the files in `media` to the open composer and waits until X has
+    uploaded them. Returns an error message, or None once they are ready.
+    """
+    paths = media_paths(media)
+    missing = [path for path in paths if not os.path.isfile(path)]
+    if missing:
+        return f"Media file not found: {', '.join(missing)}"
+    if len(paths) > MAX_MEDIA_FILES:
+        return f"X allows at most {MAX_MEDIA_FILES} media files per post."
+
+    # Twitter uses a hidden input[type="file"]
+    file_input = await page.query_selector('input[type="file"][accept*="image"]')
+    if not file_input:
+        return "Could not find file input for media."
+
+    timeout = upload_timeout(paths)
+    uploads = await UploadWatcher(page, MEDIA_UPLOAD_PATHS).start()
+    try:
+        if len(paths) == 1 or 'multiple' in (file_input.attrs or {}):
+            await file_input.send_file(*paths)
+        else:
+            for path in paths:
+                await file_input.send_file(path)
+        if not await uploads.wait(timeout):
+            return f"Media upload did not finish within {timeout:.0f}s."
+    finally:
+        uploads.stop()
+    return None
+
+async def press_ctrl_enter(page):
+    """Sends Ctrl+Enter, which submits X's composer; modifiers need raw CDP key events."""
+    await page.send(uc.cdp.input_.dispatch_key_event(
+        type_='rawKeyDown', windows_virtual_key_code=17, modifiers=2
+    ))
+    await page.send(uc.cdp.input_.dispatch_key_event(
+        type_='keyDown', windows_virtual_key_code=13, modifiers=2
+    ))
+    await page.send(uc.cdp.input_.dispatch_key_event(
+        type_='keyUp', windows_virtual_key_code=13, modifiers=2
+    ))
+    await page.send(uc.cdp.input_.dispatch_key_event(
+        type_='keyUp', windows_virtual_key_code=17, modifiers=0
+    ))
+
+async def submit_and_capture(page, auth_token, kind, text, button_selectors, composer=None, button_timeout=5):
+    """
+    Submits the open composer and returns (tweet_id, pacing_wait_ms, error)
+    for the new post, reply or quote (`kind`). Waits for the account's
+    shared pacing of `kind` first (see pacing.py), then clicks the first
+    enabled button in
+    `button_selectors` (waiting up to `button_timeout` seconds for one), or
+    sends Ctrl+Enter when there is none.
+
+    The ID comes from X's CreateTweet response. Without one, the "Your post
+    was sent" toast is the fallback, and the post counts as failed if `text`
+    is still in the composer (`composer`, default the tweet textarea).
+    `error` is a message when X rejected it or it did not go out.
+    """
+    label = kind.capitalize()
+    # Only sleeps if this account acted too recently
+    pacing_wait_ms = await pace(auth_token, kind)
+    phase('pacing')
+
+    _, button = await wait_for_any_selector(page, button_selectors, timeout=button_timeout)
+
+    # Listen for the CreateTweet response before submitting; it carries the new ID
+    created = await ResponseWatcher(page, CREATE_TWEET_OPERATIONS).start()
+    try:
+        if button:
+            await button.click()
+        else:
+            print(f"{label} button not found natively, attempting Ctrl+Enter fallback...")
+            await press_ctrl_enter(page)
+        phase('submit')
+
+        # The server's answer to CreateTweet is the completion signal
+        body = await created.wait(timeout=10)
+    finally:
+        created.stop()
+
+    tweet_id = created_tweet_id(body)
+    if not tweet_id and graphql_error(body):
+        return None, pacing_wait_ms, f"X rejected the {kind}: {graphql_error(body)}"
+
+    if not tweet_id:
+        # No usable response: fall back to the "Your post was sent" toast
+        toast = await wait_for_selector(page, '[data-testid="toast"]', timeout=5)
+
+        # The DOM might keep the composer around but hidden. The surest
+        # sign of a failed submit is our text still being in it.
+        try:
+            still_open = composer or await page.query_selector('[data-testid="tweetTextarea_0"]')
+            if still_open and text in getattr(still_open, 'value', ''):
+                return None, pacing_wait_ms, f"{label} button clicked, but text remains in composer. {label} likely failed."
+        except Exception:
+            # Element not found, which is also good (composer removed)
+            pass
+
+        tweet_id = await tweet_id_from_toast(toast)
+    phase('verify')
+    return tweet_id, pacing_wait_ms, None
+
+def attach_to_response(key, provider):
+    """Adds {key: provider()} to every response built afterwards in the current task."""
+    detach_from_response(key)
+    _response_extras.set(_response_extras.get() + ((key, provider),))
+
+def detach_from_response(key):
+    _response_extras.set(tuple(item for item in _response_extras.get() if item[0] != key))
+
+def _response_extra_fields():
+    fields = {key: provider() for key, provider in _response_extras.get()}
+    timings = current_timings()
+    if timings:
+        fields['timings'] = timings.as_dict()
+    return fields
+
+def success_response(data):
+    """Builds a standard JSON success response."""
     response = {"success": True}
     response.update(data)
-    print(json.dumps(response))
+    response.update(_response_extra_fields())
+    return response
 
-def print_error(message):
-    """Prints a standard JSON error response for Node.js to parse."""
-    print(json.dumps({
+def error_response(message):
+    """Builds a standard JSON error response."""
+    response = {
         "success": False,
         "error": message
-    }))
+    }
+    response.update(_response_extra_fields())
+    return response
+
+def print_result(result, **json_options):
+    """
+    Prints a response built by success_response/error_response for Node.js to
+    parse. Fields attached to the current task (e.g. timings) are added if
+    the response does not have them yet.
+    """
+    result = {**result, **{k: v for k, v in _response_extra_fields().items() if k not in result}}
+    print(json.dumps(result, **json_options), flush=True)
+    write_timings(result)
+
+def print_success(data):
+    """Prints a standard JSON success response for Node.js to parse."""
+    print_result(success_response(data))
+
+def print_error(message):
+    """Prints a standard JSON error response for Node.js to parse."""
+    print_result(error_response(message))
@@ -0,0 +1,388 @@
+"""
+Event-driven wait helpers for nodriver pages.
+
+Each helper returns as soon as its condition holds, and gives up after a
+hard `timeout` (seconds) instead of sleeping a fixed amount of time:
+
+- wait_for_selector / wait_for_any_selector / wait_for_selector_gone use a
+  MutationObserver promise inside the page, awaited over a single
+  Runtime.evaluate call. wait_for_any_selector probes every candidate in that
+  one call, instead of one page.select round trip per selector per poll.
+- wait_for_navigation / wait_for_network_idle listen to CDP Page/Network events.
+- UploadWatcher waits until attached media has finished uploading, from the
+  composer's attachment previews and the upload requests.
+- ResponseWatcher captures the body of a matching network response, e.g. the
+  GraphQL call that creates a tweet, so callers can finish as soon as the
+  server has answered.
+"""
+import asyncio
+import base64
+import json
+import nodriver as uc
+
+
+_ANY_SELECTOR_SCRIPT = """
+new Promise((resolve) => {
+    const selectors = %(selectors)s;
+    const match = () => selectors.find((s) => document.querySelector(s) !== null) || null;
+    const first = match();
+    if (first) return resolve(first);
+    const observer = new MutationObserver(() => {
+        const found = match();
+        if (found) {
+            observer.disconnect();
+            clearTimeout(timer);
+            resolve(found);
+        }
+    });
+    observer.observe(document.documentElement || document, {
+        childList: true, subtree: true, attributes: true, characterData: true
+    });
+    const timer = setTimeout(() => { observer.disconnect(); resolve(null); }, %(timeout_ms)d);
+})
+"""
+
+_GONE_SCRIPT = """
+new Promise((resolve) => {
+    const selector = %(selector)s;
+    const done = () => document.querySelector(selector) === null;
+    if (done()) return resolve(true);
+    const observer = new MutationObserver(() => {
+        if (done()) {
+            observer.disconnect();
+            clearTimeout(timer);
+            resolve(true);
+        }
+    });
+    observer.observe(document.documentElement || document, {
+        childList: true, subtree: true, attributes: true, characterData: true
+    });
+    const timer = setTimeout(() => { observer.disconnect(); resolve(null); }, %(timeout_ms)d);
+})
+"""
+
+# Attachment previews are shown and none of them still has a progress bar
+_UPLOADED_SCRIPT = """
+new Promise((resolve) => {
+    const done = () => {
+        const attachments = document.querySelector('[data-testid="attachments"]');
+        return attachments !== null && attachments.querySelector('[role="progressbar"]') === null;
+    };
+    if (done()) return resolve(true);
+    const observer = new MutationObserver(() => {
+        if (done()) {
+            observer.disconnect();
+            clearTimeout(timer);
+            resolve(true);
+        }
+    });
+    observer.observe(document.documentElement || document, {
+        childList: true, subtree: true, attributes: true, characterData: true
+    });
+    const timer = setTimeout(() => { observer.disconnect(); resolve(null); }, %(timeout_ms)d);
+})
+"""
+
+
+# Chrome's messages for an evaluation whose document went away (navigation,
+# reload): the wait is re-armed on the new document instead of failing
+_CONTEXT_LOST_MESSAGES = (
+    'Execution context was destroyed',
+    'Cannot find context with specified id',
+    'Cannot find default execution context',
+    'Inspected target navigated or closed',
+    'Promise was collected',
+)
+
+
+async def evaluate_value(page, expression, await_promise=False):
+    """
+    Evaluates `expression` and returns its JSON value. Unlike page.evaluate,
+    falsy results come back as-is and script errors raise.
+    """
+    remote_object, errors = await page.send(uc.cdp.runtime.evaluate(
+        expression=expression,
+        await_promise=await_promise,
+        return_by_value=True,
+        user_gesture=True,
+        allow_unsafe_eval_blocked_by_csp=True
+    ))
+    if errors:
+        raise RuntimeError(errors.exception.description if errors.exception else errors.text)
+    return remote_object.value if remote_object else None
+
+
+async def _wait_in_page(page, build_script, timeout):
+    """
+    Runs a promise-returning script and returns what it resolves to, or None
+    on timeout. Re-arms the script if a navigation destroys the execution
+    context; any other script or protocol error is raised.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return None
+        try:
+            return await asyncio.wait_for(
+                evaluate_value(page, build_script(int(remaining * 1000)), await_promise=True),
+                timeout=remaining + 1
+            )
+        except asyncio.TimeoutError:
+            return None
+        except Exception as e:
+            if not _is_context_lost(e):
+                raise
+            # Execution context was replaced mid-wait (navigation); try again on the new document
+            await asyncio.sleep(0.1)
+
+
+def _is_context_lost(error):
+    message = str(error)
+    return any(marker in message for marker in _CONTEXT_LOST_MESSAGES)
+
+
+async def wait_for_any_selector(page, selectors, timeout=10):
+    """
+    Waits until one of `selectors` matches. Candidates are checked in order,
+    so list the preferred one first. Returns (selector, element) for the
+    match, or (None, None) on timeout.
+    """
+    matched = await _wait_in_page(page, lambda ms: _ANY_SELECTOR_SCRIPT % {
+        "selectors": json.dumps(list(selectors)),
+        "timeout_ms": ms,
+    }, timeout)
+
+    if not matched:
+        return None, None
+    try:
+        return matched, await page.query_selector(matched)
+    except Exception:
+        return None, None
+
+
+async def wait_for_selector(page, selector, timeout=10):
+    """Waits until `selector` matches an element and returns it, or None on timeout."""
+    _, element = await wait_for_any_selector(page, [selector], timeout)
+    return element
+
+
+async def wait_for_selector_gone(page, selector, timeout=10):
+    """Waits until nothing matches `selector`. Returns False on timeout."""
+    gone = await _wait_in_page(page, lambda ms: _GONE_SCRIPT % {
+        "selector": json.dumps(selector),
+        "timeout_ms": ms,
+    }, timeout)
+    return bool(gone)
+
+
+async def wait_for_navigation(page, url_contains=None, timeout=15):
+    """
+    Waits until the main frame has parsed its document (DOMContentLoaded) and,
+    if given, its URL contains `url_contains`. Returns the URL, or None on timeout.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    changed = asyncio.Event()
+
+    def on_page_event(event):
+        changed.set()
+
+    events = (uc.cdp.page.DomContentEventFired, uc.cdp.page.FrameNavigated, uc.cdp.page.LoadEventFired)
+    for event_type in events:
+        page.add_handler(event_type, on_page_event)
+
+    try:
+        await page.send(uc.cdp.page.enable())
+        while True:
+            changed.clear()
+            try:
+                state = await evaluate_value(page, '[window.location.href, document.readyState]')
+            except Exception:
+                state = None
+
+            if state:
+                url, ready_state = state
+                if ready_state != 'loading' and (not url_contains or url_contains in url):
+                    return url
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return None
+    finally:
+        for event_type in events:
+            page.remove_handler(event_type, on_page_event)
+
+
+async def wait_for_network_idle(page, idle_time=0.5, timeout=10, max_inflight=0):
+    """
+    Waits until at most `max_inflight` requests have been pending for
+    `idle_time` seconds. x.com keeps a few long-lived connections open, so
+    callers there usually want max_inflight=2. Returns False on timeout.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    inflight = set()
+    changed = asyncio.Event()
+
+    def on_request(event):
+        inflight.add(event.request_id)
+        changed.set()
+
+    def on_finished(event):
+        inflight.discard(event.request_id)
+        changed.set()
+
+    handlers = (
+        (uc.cdp.network.RequestWillBeSent, on_request),
+        (uc.cdp.network.LoadingFinished, on_finished),
+        (uc.cdp.network.LoadingFailed, on_finished),
+    )
+    for event_type, handler in handlers:
+        page.add_handler(event_type, handler)
+
+    try:
+        await page.send(uc.cdp.network.enable())
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+
+            changed.clear()
+            quiet = len(inflight) <= max_inflight
+            window = min(idle_time, remaining) if quiet else remaining
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=window)
+            except asyncio.TimeoutError:
+                if quiet and window >= idle_time:
+                    return True
+                if not quiet:
+                    return False
+    finally:
+        for event_type, handler in handlers:
+            page.remove_handler(event_type, handler)
+
+
+class ResponseWatcher:
+    """
+    Captures the JSON body of the first response whose URL contains one of
+    `url_parts`. Call start() before triggering the request, then wait().
+    """
+
+    def __init__(self, page, url_parts):
+        self.page = page
+        self.url_parts = tuple(url_parts)
+        self.status = None
+        self._request_ids = set()
+        self._done = asyncio.Event()
+        self._body = None
+        self._handlers = (
+            (uc.cdp.network.ResponseReceived, self._on_response),
+            (uc.cdp.network.LoadingFinished, self._on_finished),
+            (uc.cdp.network.LoadingFailed, self._on_failed),
+        )
+
+    async def start(self):
+        for event_type, handler in self._handlers:
+            self.page.add_handler(event_type, handler)
+        await self.page.send(uc.cdp.network.enable())
+        return self
+
+    def stop(self):
+        for event_type, handler in self._handlers:
+            self.page.remove_handler(event_type, handler)
+
+    async def wait(self, timeout=10):
+        """Returns the parsed body, or None on timeout, failure or a non-JSON body."""
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        return self._body
+
+    def _on_response(self, event):
+        if not self._done.is_set() and any(part in event.response.url for part in self.url_parts):
+            self._request_ids.add(event.request_id)
+            self.status = event.response.status
+
+    async def _on_finished(self, event):
+        if event.request_id not in self._request_ids or self._done.is_set():
+            return
+        try:
+            body, is_base64 = await self.page.send(uc.cdp.network.get_response_body(request_id=event.request_id))
+            if is_base64:
+                body = base64.b64decode(body).decode('utf-8', errors='replace')
+            self._body = json.loads(body)
+        except Exception:
+            self._body = None
+        self._done.set()
+
+    def _on_failed(self, event):
+        if event.request_id in self._request_ids:
+            self._done.set()
+
+
+class UploadWatcher:
+    """
+    Tracks upload requests whose URL contains one of `url_parts`. Call
+    start() before attaching files; wait() returns once the composer shows
+    its attachments without a progress bar and no upload request is in flight.
+    """
+
+    def __init__(self, page, url_parts):
+        self.page = page
+        self.url_parts = tuple(url_parts)
+        self.inflight = set()
+        self._changed = asyncio.Event()
+        self._handlers = (
+            (uc.cdp.network.RequestWillBeSent, self._on_request),
+            (uc.cdp.network.LoadingFinished, self._on_finished),
+            (uc.cdp.network.LoadingFailed, self._on_finished),
+        )
+
+    async def start(self):
+        for event_type, handler in self._handlers:
+            self.page.add_handler(event_type, handler)
+        await self.page.send(uc.cdp.network.enable())
+        return self
+
+    def stop(self):
+        for event_type, handler in self._handlers:
+            self.page.remove_handler(event_type, handler)
+
+    async def wait(self, timeout=60):
+        """Returns True once the uploads are done, False on timeout."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while True:
+            # Videos are polled for processing status between requests, so the
+            # previews decide; the requests catch previews that finish early
+            ready = await _wait_in_page(self.page, lambda ms: _UPLOADED_SCRIPT % {"timeout_ms": ms},
+                                        deadline - loop.time())
+            if not ready:
+                return False
+
+            self._changed.clear()
+            if not self.inflight:
+                return True
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=max(0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                return False
+
+    def _on_request(self, event):
+        if any(part in event.request.url for part in self.url_parts):
+            self.inflight.add(event.request_id)
+            self._changed.set()
+
+    def _on_finished(self, event):
+        if event.request_id in self.inflight:
+            self.inflight.discard(event.request_id)
+            self._changed.set()
@@ -0,0 +1,261 @@
+"""
+Long-lived worker for the nodriver action scripts.
+
+Instead of spawning a fresh Python process per action, start one worker and
+send it newline-delimited JSON commands, either on stdin or on a local Unix
+socket. Each command gets exactly one JSON result line back:
+
+    {"id": "1", "action": "post", "token": "...", "text": "hello"}
+    {"id": "2", "action": "reply", "token": "...", "target": "https://x.com/i/status/1", "text": "hi"}
+    {"id": "3", "action": "quote", "token": "...", "target": "https://x.com/i/status/1", "text": "look"}
+    {"id": "4", "action": "campaign", "token": "...", "campaign": {"tweets": [...], "replies": [...]}}
+    {"id": "5", "action": "ping"}
+    {"id": "6", "action": "shutdown"}
+
+post, reply and quote also take "media" (a path or a list of paths) and
+"humanTyping": true to type word by word instead of inserting the text at once.
+
+Results echo the command id: {"id": "1", "success": true, "tweetId": "..."}
+
+Authenticated browsers are kept in a SessionPool between commands, so a run
+of actions for the same account pays for Chrome startup and login once. With
+--accounts-per-browser N, up to N accounts share a Chrome, each in its own
+browser context.
+
+Usage (from scripts/):
+    python -m twitter_actions.worker
+    python -m twitter_actions.worker --socket /tmp/xactions-worker.sock
+"""
+import asyncio
+import argparse
+import json
+import os
+import stat
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils import error_response, success_response, export_timings, write_timings, add_timing_arguments
+from session_pool import SessionPool
+from display import add_run_mode_argument
+from nodriver_post import post_tweet
+from nodriver_reply import reply_tweet
+from nodriver_quote import quote_tweet
+from campaign import run_campaign
+
+
+ACTIONS = {
+    'post': lambda cmd, pool: post_tweet(cmd['token'], cmd['text'], cmd.get('media'), pool=pool,
+                                         human_typing=cmd.get('humanTyping', False)),
+    'reply': lambda cmd, pool: reply_tweet(cmd['token'], cmd['target'], cmd['text'], cmd.get('media'), pool=pool,
+                                           human_typing=cmd.get('humanTyping', False)),
+    'quote': lambda cmd, pool: quote_tweet(cmd['token'], cmd['target'], cmd['text'], cmd.get('media'), pool=pool,
+                                           human_typing=cmd.get('humanTyping', False)),
+    'campaign': lambda cmd, pool: run_campaign(cmd['token'], cmd['campaign'], pool=pool, delay=cmd.get('delay', 0)),
+}
+
+
+class Worker:
+    def __init__(self, concurrency=1, pool=None):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.stopping = asyncio.Event()
+        self.pool = pool
+
+    async def handle_line(self, line):
+        """Parses one command line and returns its JSON result dict."""
+        try:
+            cmd = json.loads(line)
+        except json.JSONDecodeError as e:
+            return error_response(f"Invalid JSON command: {str(e)}")
+
+        if not isinstance(cmd, dict):
+            return error_response("Command must be a JSON object.")
+
+        result = await self.dispatch(cmd)
+        if 'id' in cmd:
+            result = {"id": cmd['id'], **result}
+        write_timings(result)
+        return result
+
+    async def dispatch(self, cmd):
+        action = cmd.get('action')
+
+        if action == 'ping':
+            return success_response({"message": "pong"})
+        if action == 'shutdown':
+            self.stopping.set()
+            return success_response({"message": "Worker shutting down"})
+
+        handler = ACTIONS.get(action)
+        if not handler:
+            return error_response(f"Unknown action: {action}")
+
+        async with self.semaphore:
+            try:
+                result = await handler(cmd, self.pool)
+            except KeyError as e:
+                return error_response(f"Missing required field for {action}: {e.args[0]}")
+            except Exception as e:
+                return error_response(f"Error during {action}: {str(e)}")
+
+        return result or error_response(f"{action} returned no result")
+
+
+async def serve_stdio(worker, out):
+    """Reads commands from stdin and writes results to `out`, one per line."""
+    pending = set()
+    write_lock = asyncio.Lock()
+
+    async def run(line):
+        result = await worker.handle_line(line)
+        async with write_lock:
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+
+    while not worker.stopping.is_set():
+        # readline on a thread keeps this working with Windows pipes too
+        line = await asyncio.to_thread(sys.stdin.readline)
+        if not line:
+            break
+        line = line.strip()
+        if not line:
+            continue
+        if _is_shutdown(line):
+            # Handled inline so no stdin read is left blocking after we stop
+            await run(line)
+            break
+        task = asyncio.create_task(run(line))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    if pending:
+        await asyncio.gather(*pending)
+
+
+def _is_shutdown(line):
+    try:
+        cmd = json.loads(line)
+    except json.JSONDecodeError:
+        return False
+    return isinstance(cmd, dict) and cmd.get('action') == 'shutdown'
+
+
+async def serve_socket(worker, path):
+    """
+    Serves the same line protocol on a Unix domain socket. A socket left at
+    `path` by an earlier worker is replaced; anything else there raises
+    FileExistsError.
+    """
+    remove_socket(path)
+
+    handlers = set()
+
+    async def on_client(reader, writer):
+        handler = asyncio.current_task()
+        handlers.add(handler)
+        write_lock = asyncio.Lock()
+        pending = set()
+        stopping = asyncio.create_task(worker.stopping.wait())
+
+        async def run(line):
+            result = await worker.handle_line(line)
+            async with write_lock:
+                writer.write((json.dumps(result) + '\n').encode('utf-8'))
+                await writer.drain()
+
+        try:
+            while True:
+                read = asyncio.create_task(reader.readline())
+                await asyncio.wait({read, stopping}, return_when=asyncio.FIRST_COMPLETED)
+                if not read.done():
+                    # Shutting down: stop reading, but answer what was already sent
+                    read.cancel()
+                    await asyncio.gather(read, return_exceptions=True)
+                    break
+                raw = read.result()
+                if not raw:
+                    break
+                line = raw.decode('utf-8').strip()
+                if not line:
+                    continue
+                task = asyncio.create_task(run(line))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        finally:
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            stopping.cancel()
+            handlers.discard(handler)
+            writer.close()
+
+    server = await asyncio.start_unix_server(on_client, path=path)
+    try:
+        await worker.stopping.wait()
+    finally:
+        server.close()
+        # Every client gets the results of its commands before the pool is closed
+        if handlers:
+            await asyncio.gather(*handlers, return_exceptions=True)
+        await server.wait_closed()
+        remove_socket(path)
+
+
+def remove_socket(path):
+    """Unlinks `path` if it is a Unix socket; raises FileExistsError if it is anything else."""
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"{path} exists and is not a socket; refusing to replace it.")
+    os.unlink(path)
+
+
+async def main(args):
+    # Action scripts print progress messages; keep stdout reserved for results.
+    out = sys.stdout
+    sys.stdout = sys.stderr
+
+    pool = SessionPool(
+        max_sessions=args.max_sessions,
+        idle_ttl=args.idle_ttl,
+        block_profile='actions' if args.block_resources else None,
+        persistent=args.persistent_profiles,
+        run_mode=args.run_mode,
+        accounts_per_browser=args.accounts_per_browser
+    )
+    worker = Worker(concurrency=args.concurrency, pool=pool)
+    try:
+        if args.socket:
+            if not hasattr(asyncio, 'start_unix_server'):
+                out.write(json.dumps(error_response("Unix sockets are not supported on this platform.")) + '\n')
+                return
+            try:
+                await serve_socket(worker, args.socket)
+            except FileExistsError as e:
+                out.write(json.dumps(error_response(str(e))) + '\n')
+        else:
+            await serve_stdio(worker, out)
+    finally:
+        await pool.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Persistent worker for post/reply/quote actions')
+    parser.add_argument('--socket', required=False, help='Listen on this Unix socket path instead of stdin')
+    parser.add_argument('--concurrency', type=int, default=1, help='Max actions running at the same time')
+    parser.add_argument('--max-sessions', type=int, default=4, help='Max warm browser sessions kept in the pool')
+    parser.add_argument('--idle-ttl', type=float, default=300, help='Seconds before an idle session is closed')
+    parser.add_argument('--block-resources', action='store_true', help='Skip images, video, fonts and analytics in every session')
+    parser.add_argument('--persistent-profiles', action='store_true', help='Keep a Chrome profile per account between worker runs')
+    parser.add_argument('--accounts-per-browser', type=int, default=1,
+                        help='Accounts sharing one Chrome, each in its own browser context (1 = a Chrome per account)')
+    add_run_mode_argument(parser)
+    add_timing_arguments(parser)
+    args = parser.parse_args()
+    if args.accounts_per_browser > 1 and args.persistent_profiles:
+        parser.error("--persistent-profiles needs a Chrome per account and cannot be combined with --accounts-per-browser")
+    if args.timings_file:
+        export_timings(args.timings_file, args.timings_format)
+
+    asyncio.run(main(args))
@@ -0,0 +1,5 @@
+"""
+Command line entry point for the Python scripts; see __main__.py.
+
+Importing this package only touches the standard library.
+"""
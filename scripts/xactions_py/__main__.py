@@ -0,0 +1,80 @@
+"""
+One entry point for the Python scripts:
+
+    python -m xactions_py <command> [options]
+    python -m xactions_py --help | --version
+
+Run from scripts/ or with scripts/ on PYTHONPATH. A command runs the
+existing script as __main__ with its own options (`python -m xactions_py
+post --help` lists the post options) and prints the same JSON. Only the
+modules of the chosen command are imported: --help and --version never load
+nodriver, and trends stays on its nodriver-free HTTP path.
+"""
+import json
+import os
+import runpy
+import sys
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ACTIONS_DIR = os.path.join(SCRIPTS_DIR, 'twitter_actions')
+
+# command -> (module, description)
+COMMANDS = {
+    'post': ('nodriver_post', 'Post a tweet'),
+    'reply': ('nodriver_reply', 'Reply to a tweet'),
+    'quote': ('nodriver_quote', 'Quote a tweet'),
+    'campaign': ('campaign', 'Run a whole campaign for one account'),
+    'login': ('nodriver_login', 'Log in interactively and print the auth_token'),
+    'check-suspension': ('check_suspension', 'Check whether accounts are suspended'),
+    'safe-browser': ('safe_browser', 'Open a logged-in browser for manual use'),
+    'trends': ('trend_extractor', 'Extract countries or trends from getdaytrends.com'),
+    'worker': ('worker', 'Serve JSON commands from stdin or a Unix socket'),
+    'engine': ('engine', 'Run jobs for many accounts in parallel'),
+}
+
+
+def version():
+    """The XActions version from package.json."""
+    try:
+        with open(os.path.join(SCRIPTS_DIR, os.pardir, 'package.json'), encoding='utf-8') as f:
+            return json.load(f)['version']
+    except (OSError, ValueError, KeyError):
+        return 'unknown'
+
+
+def usage():
+    width = max(len(name) for name in COMMANDS)
+    lines = ['usage: python -m xactions_py <command> [options]', '', 'commands:']
+    lines += [f'  {name:<{width}}  {description}' for name, (_, description) in COMMANDS.items()]
+    lines += ['', 'Run "python -m xactions_py <command> --help" for the options of a command.']
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage(), file=sys.stdout if argv else sys.stderr)
+        return 0 if argv else 2
+    if argv[0] == '--version':
+        print(f'xactions_py {version()}')
+        return 0
+
+    command, rest = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(f'{usage()}\n\nunknown command: {command}', file=sys.stderr)
+        return 2
+
+    # Scripts import their siblings by bare name ("from utils import ..."),
+    # which this makes independent of the working directory
+    for path in (ACTIONS_DIR, SCRIPTS_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+    module = COMMANDS[command][0]
+    sys.argv = [module, *rest]
+    runpy.run_module(module, run_name='__main__', alter_sys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
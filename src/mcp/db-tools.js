@@ -62,7 +62,6 @@ async function executeAutomationForAccount(authToken, content, accountName) {
                 if (t.media) args.push('--media', t.media);
                 const res = await runPythonScript('nodriver_post.py', args);
                 results.push({ type: 'tweet', text: t.text.substring(0, 30), ...res });
-                await new Promise(r => setTimeout(r, 5000));
             } catch (e) {
                 results.push({ type: 'tweet', success: false, error: e.message });
             }
@@ -78,7 +77,6 @@ async function executeAutomationForAccount(authToken, content, accountName) {
                 if (r.media) args.push('--media', r.media);
                 const res = await runPythonScript('nodriver_reply.py', args);
                 results.push({ type: 'reply', target: r.target, ...res });
-                await new Promise(r2 => setTimeout(r2, 5000));
             } catch (e) {
                 results.push({ type: 'reply', success: false, error: e.message });
             }
@@ -94,7 +92,6 @@ async function executeAutomationForAccount(authToken, content, accountName) {
                 if (q.media) args.push('--media', q.media);
                 const res = await runPythonScript('nodriver_quote.py', args);
                 results.push({ type: 'quote', target: q.target, ...res });
-                await new Promise(r2 => setTimeout(r2, 5000));
             } catch (e) {
                 results.push({ type: 'quote', success: false, error: e.message });
             }
@@ -1,40 +1,30 @@
 import asyncio
+import os
+import sys
 import nodriver as uc
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from trend_extractor import extract_from_page
+
 async def test_scrape():
     browser = await uc.start()
     page = await browser.get('https://getdaytrends.com/')
-    
-    await asyncio.sleep(5) # Wait for page load
-    
+
     print("--- Testing Top Trends Extraction ---")
-    rows = await page.select_all('table.table tbody tr')
-    for i, row in enumerate(rows[:5]):
-        try:
-            rank = await row.query_selector('th')
-            rank_text = rank.text if rank else "?"
-            
-            name_el = await row.query_selector('a.string')
-            name_text = name_el.text if name_el else "?"
-            
-            tweets_el = await row.query_selector('div.small.text-muted')
-            tweets_text = tweets_el.text if tweets_el else ""
-            
-            print(f"[{rank_text}] {name_text} - {tweets_text}")
-        except Exception as e:
-            print("Row err:", e)
-            
+    try:
+        trends = await extract_from_page(page, 'trends')
+        for trend in trends[:5]:
+            print(f"[{trend['rank']}] {trend['name']} - {trend['volume']}")
+    except Exception as e:
+        print("Trends extraction error:", e)
+
     print("\n--- Testing Countries Extraction ---")
     try:
-        # Looking for country links
-        areas = await page.select_all('#dropdown-areas a')
-        if not areas:
-            areas = await page.select_all('#dropdown-countries a')
-            
-        print(f"Found {len(areas)} areas/countries.")
-        for a in areas[:10]:
-            print(f"{a.text} -> {getattr(a, 'href', '')}")
-            
+        countries = await extract_from_page(page, 'countries')
+        print(f"Found {len(countries)} areas/countries.")
+        for country in countries[:10]:
+            print(f"{country['name']} -> /{country['slug']}/")
+
     except Exception as e:
          print("Country extraction error:", e)
 